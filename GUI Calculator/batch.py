@@ -0,0 +1,187 @@
+import argparse
+import csv
+import math
+import operator
+import sys
+
+from engine import MATH, NOT_CONSTANT, Backend, Engine, ExpressionError, free_names, parse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Evaluate one expression over whole columns of variable values. With NumPy
+# the compiled closures run once, on arrays; without it every row goes
+# through the math backend in a loop. Rows with no real answer come out as
+# nan (or inf, following NumPy's float rules, when vectorized).
+#
+#   python batch.py "sin(x)*y" --range x=0:6.3:0.1 --var y=2
+#   python batch.py "price*qty" --csv orders.csv --column qty=quantity -o totals.csv
+
+
+def vector_backend():
+    # 170! is the largest factorial a double holds
+    table = numpy.array([float(math.factorial(n)) for n in range(171)])
+
+    def factorial(values):
+        values = numpy.asarray(values, dtype=float)
+        whole = (values >= 0) & (values == numpy.floor(values))
+        small = whole & (values <= 170)
+        index = numpy.where(small, values, 0).astype(int)
+        return numpy.where(small, table[index], numpy.where(whole, numpy.inf, numpy.nan))
+
+    return Backend(
+        number=float,
+        operators={
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": numpy.true_divide,
+            "^": numpy.power,
+            "neg": numpy.negative,
+            "!": factorial,
+        },
+        functions={
+            "sin": numpy.sin,
+            "cos": numpy.cos,
+            "tan": numpy.tan,
+            "log": numpy.log10,
+            "ln": numpy.log,
+            "sqrt": numpy.sqrt,
+            "sqr": numpy.square,
+        },
+        constants={"π": numpy.pi, "pi": numpy.pi, "e": numpy.e},
+    )
+
+
+VECTOR = vector_backend() if numpy is not None else None
+
+
+def check_names(text, variables, backend):
+    missing = free_names(parse(text), backend) - set(variables)
+    if missing:
+        raise ExpressionError(f"no values for {', '.join(sorted(missing))}")
+
+
+def evaluate_batch(text, variables, engine=None, vectorized=True):
+    # variables maps a name to a sequence of values or a single number; every
+    # sequence must have the same length. Returns a NumPy array, or a list of
+    # floats without NumPy (or with vectorized=False).
+    if vectorized and numpy is not None:
+        engine = engine or Engine(VECTOR)
+        check_names(text, variables, engine.backend)
+        arrays = {name: numpy.asarray(values, dtype=float) for name, values in variables.items()}
+        shape = numpy.broadcast_shapes((1,), *(array.shape for array in arrays.values()))
+        with numpy.errstate(all="ignore"):
+            result = engine.evaluate(text, arrays)
+        return numpy.array(numpy.broadcast_to(result, shape), dtype=float)
+
+    engine = engine or Engine(MATH)
+    check_names(text, variables, engine.backend)
+    columns = {name: list(values) if hasattr(values, "__len__") else [values] for name, values in variables.items()}
+    rows = max(map(len, columns.values()), default=1)
+    for name, column in columns.items():
+        if len(column) not in (1, rows):
+            raise ValueError(f"{name} has {len(column)} values, expected {rows}")
+    closure, constant = engine.compile(text)
+    results = []
+    for row in range(rows):
+        env = {name: column[row if len(column) > 1 else 0] for name, column in columns.items()}
+        try:
+            results.append(float(constant if constant is not NOT_CONSTANT else closure(env)))
+        except (ArithmeticError, ValueError):
+            results.append(math.nan)
+    return results
+
+
+def frange(start, stop, step=1.0):
+    if numpy is not None:
+        return numpy.arange(start, stop, step)
+    return [start + i * step for i in range(max(0, math.ceil((stop - start) / step)))]
+
+
+def read_columns(path, columns):
+    # columns maps variable -> CSV header; blank or non-numeric cells are nan
+    values = {name: [] for name in columns}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        absent = set(columns.values()) - set(reader.fieldnames or ())
+        if absent:
+            raise ValueError(f"{path} has no column {', '.join(sorted(absent))}")
+        for record in reader:
+            for name, header in columns.items():
+                try:
+                    values[name].append(float(record[header]))
+                except (TypeError, ValueError):
+                    values[name].append(math.nan)
+    return values
+
+
+def split_assignment(text):
+    name, sep, value = text.partition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name, value
+
+
+def range_spec(text):
+    # NAME=START:STOP[:STEP] -> (name, [start, stop] or [start, stop, step])
+    name, spec = split_assignment(text)
+    parts = spec.split(":")
+    try:
+        bounds = [float(part) for part in parts]
+    except ValueError:
+        bounds = None
+    if bounds is None or len(bounds) not in (2, 3) or not all(map(math.isfinite, bounds)):
+        raise argparse.ArgumentTypeError(f"expected NAME=START:STOP[:STEP], got {text!r}")
+    if len(bounds) == 3 and bounds[2] == 0:
+        raise argparse.ArgumentTypeError(f"step of {name} must not be 0")
+    return name, bounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a calculator expression over columns of values")
+    parser.add_argument("expression")
+    parser.add_argument("--range", action="append", default=[], type=range_spec, metavar="NAME=START:STOP[:STEP]",
+                        help="values from START up to (not including) STOP")
+    parser.add_argument("--var", action="append", default=[], type=split_assignment, metavar="NAME=V1,V2,...",
+                        help="explicit values, or a single value used for every row")
+    parser.add_argument("--csv", help="read the remaining variables from columns of this file")
+    parser.add_argument("--column", action="append", default=[], type=split_assignment, metavar="NAME=HEADER",
+                        help="read NAME from the CSV column HEADER instead of the column called NAME")
+    parser.add_argument("-o", "--output", help="write the CSV result here instead of stdout")
+    parser.add_argument("--no-numpy", action="store_true", help="evaluate row by row with the math module")
+    args = parser.parse_args()
+
+    variables = {}
+    try:
+        for name, bounds in args.range:
+            variables[name] = frange(*bounds)
+        for name, spec in args.var:
+            variables[name] = [float(value) for value in spec.split(",")]
+        if args.csv:
+            names = free_names(parse(args.expression), MATH)
+            columns = {name: name for name in names if name not in variables}
+            columns.update((name, header) for name, header in args.column)
+            variables.update(read_columns(args.csv, columns))
+        results = evaluate_batch(args.expression, variables, vectorized=not args.no_numpy)
+    except (ArithmeticError, OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+
+    names = sorted(variables)
+    columns = [variables[name] for name in names]
+    rows = len(results)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(names + ["result"])
+        for row in range(rows):
+            writer.writerow([column[row if len(column) > 1 else 0] for column in columns] + [results[row]])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
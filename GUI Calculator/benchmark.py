@@ -0,0 +1,259 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+from engine import Engine, budgeted, parse
+from precision import backend_for, decimal_backend, e_to, pi_to
+from worker import needs_worker
+
+# Timings for the expression engine and for starting the app, headless.
+# Expressions are evaluated as the app does it: with the digit-budgeted
+# backend, and in float mode after needs_worker() has picked the route. Each
+# one in the corpus is timed three ways: parse only, cold (a fresh Engine
+# and backend, with no memoized constants: tokenize, parse, compile and
+# evaluate) and cached (the same Engine again, as when a history entry is
+# re-run). Startup is timed in
+# fresh interpreters. Results are saved as JSON and compared with a saved
+# baseline; anything slower than the baseline by more than the tolerance
+# is reported and the exit status is 1.
+#
+#   python benchmark.py --save baseline.json
+#   python benchmark.py --baseline baseline.json --tolerance 0.3
+#   python benchmark.py --only factorial --profile reports/
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# The app's default limit on exact results (main.py --max-digits)
+MAX_DIGITS = 10000
+
+
+def chain(terms):
+    return "+".join(f"{i}*{i + 1}" for i in range(terms))
+
+
+def nested(depth):
+    return "(" * depth + "1" + "+1)" * depth
+
+
+# name -> (expression, mode, digits, variables)
+CORPUS = {
+    "arithmetic": ("12.5*4-3/7+2^10", "float", 50, {}),
+    "functions": ("sin(30)+cos(45)*tan(60)-ln(2)+log(1000)+sqrt(2)", "float", 50, {}),
+    "implicit": ("2π(3+4)sin(1)e", "float", 50, {}),
+    "answer": ("Ans*2+Ans/3-sqrt(Ans)", "float", 50, {"Ans": 12345.678}),
+    "nested_100": (nested(100), "float", 50, {}),
+    "chain_500": (chain(500), "float", 50, {}),
+    "power_tower": ("2^2^2^2", "float", 50, {}),
+    "big_power": ("7^5000", "float", 50, {}),
+    "factorial_1000": ("1000!", "float", 50, {}),
+    "factorial_3000": ("3000!", "float", 50, {}),
+    "decimal_constants": ("sqrt(2)*π+e", "decimal", 1000, {}),
+    "decimal_sine": ("sin(1)+cos(1)", "decimal", 1000, {}),
+    "decimal_factorial": ("1000!", "decimal", 50, {}),
+    "fraction_sum": ("+".join(f"1/{k}" for k in range(1, 201)), "fraction", 50, {}),
+}
+
+STARTUP = {
+    # Importing everything the app needs except Tk
+    "import": "import engine, batch, history, plot, precision, theme, worker",
+    # Constructing the app and drawing its first frame
+    "first_frame": (
+        "import tkinter as tk\n"
+        "import main\n"
+        "root = tk.Tk()\n"
+        "app = main.CalculatorApp(root, history_path=':memory:')\n"
+        "root.update()\n"
+        "app.close()\n"
+    ),
+}
+
+
+def measure(function, repeat=5):
+    # Seconds per call: best and median of repeat rounds, each long enough
+    # (about 0.2 s) for the clock not to matter
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    rounds = [total / number for total in timer.repeat(repeat, number)]
+    return {"best": min(rounds), "median": statistics.median(rounds), "calls": number * repeat}
+
+
+def app_engine(mode, digits):
+    # The engine the app builds: inline in float mode, in the worker otherwise
+    return Engine(budgeted(backend_for(mode, digits), MAX_DIGITS))
+
+
+def app_evaluate(engine, text, mode, variables):
+    if mode == "float":
+        needs_worker(text, variables)
+    return engine.evaluate(text, variables)
+
+
+def cold_evaluate(text, mode, digits, variables):
+    # π, e and decimal backends are memoized per precision; a first
+    # evaluation in a fresh worker has none of them
+    pi_to.cache_clear()
+    e_to.cache_clear()
+    decimal_backend.cache_clear()
+    return app_evaluate(app_engine(mode, digits), text, mode, variables)
+
+
+def engine_cases(names):
+    for name in names:
+        text, mode, digits, variables = CORPUS[name]
+        cached = app_engine(mode, digits)
+        yield f"engine/{name}/parse", lambda text=text: parse(text)
+        yield f"engine/{name}/cold", lambda args=(text, mode, digits, variables): cold_evaluate(*args)
+        yield f"engine/{name}/cached", lambda args=(cached, text, mode, variables): app_evaluate(*args)
+
+
+def time_startup(name, repeat=3):
+    # Each run is a fresh interpreter, so imports are really cold
+    script = f"import time\nstarted = time.perf_counter()\n{STARTUP[name].rstrip()}\nprint(time.perf_counter() - started)\n"
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", script], cwd=HERE, capture_output=True, text=True)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            last = lines[-1] if lines else f"exit status {result.returncode}"
+            # No display for Tk is expected on a headless machine; anything
+            # else is a failure that a comparison should report
+            if "TclError" in last and "display" in last:
+                return {"skipped": last}
+            return {"error": last}
+        runs.append(float(result.stdout.split()[-1]))
+    return {"best": min(runs), "median": statistics.median(runs), "calls": repeat}
+
+
+def run(names, startup=True, repeat=5, progress=None):
+    timings = {}
+    for key, function in engine_cases(names):
+        try:
+            timings[key] = measure(function, repeat)
+        except Exception as e:
+            timings[key] = {"error": str(e) or type(e).__name__}
+        if progress:
+            progress(key, timings[key])
+    if startup:
+        for name in STARTUP:
+            key = f"startup/{name}"
+            timings[key] = time_startup(name)
+            if progress:
+                progress(key, timings[key])
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "timings": timings,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # -> [(key, baseline seconds, new seconds)] for every timing slower than
+    # its baseline by more than tolerance (0.25 is 25%), or failing now
+    regressions = []
+    for key, new in results["timings"].items():
+        old = baseline.get("timings", {}).get(key)
+        if old is None or "best" not in old:
+            continue
+        if "best" not in new:
+            if "error" in new:
+                regressions.append((key, old["best"], None))
+        elif new["best"] > old["best"] * (1 + tolerance):
+            regressions.append((key, old["best"], new["best"]))
+    return regressions
+
+
+def profile(names, directory, top=40):
+    # Where the time goes (cProfile, by cumulative time) and where memory is
+    # allocated (tracemalloc), over one cold and one cached run of each case
+    os.makedirs(directory, exist_ok=True)
+    functions = [function for key, function in engine_cases(names) if not key.endswith("/parse")]
+
+    profiler = cProfile.Profile()
+    for function in functions:
+        try:
+            profiler.runcall(function)
+        except Exception:
+            pass
+    profiler.dump_stats(os.path.join(directory, "engine.prof"))
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+    with open(os.path.join(directory, "engine-time.txt"), "w") as f:
+        f.write(report.getvalue())
+
+    tracemalloc.start(10)
+    for function in functions:
+        try:
+            function()
+        except Exception:
+            pass
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with open(os.path.join(directory, "engine-memory.txt"), "w") as f:
+        f.write(f"peak {peak / 1024:.1f} KiB\n\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            f.write(f"{stat}\n")
+
+
+def show(key, timing):
+    if "best" in timing:
+        print(f"{key:<42} {timing['best'] * 1e6:>12.1f} us  (median {timing['median'] * 1e6:.1f})")
+    else:
+        print(f"{key:<42} {'-':>12}     {timing.get('skipped') or timing.get('error')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calculator engine and app startup")
+    parser.add_argument("--only", action="append", default=[], metavar="TEXT",
+                        help="only corpus entries whose name contains TEXT")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case")
+    parser.add_argument("--no-startup", action="store_true", help="skip the startup timings")
+    parser.add_argument("--save", metavar="FILE", help="write the results here as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much slower than the baseline counts as a regression (default 0.25)")
+    parser.add_argument("--profile", metavar="DIR", help="also write cProfile and tracemalloc reports here")
+    args = parser.parse_args()
+
+    names = [name for name in CORPUS if not args.only or any(text in name for text in args.only)]
+    if not names:
+        sys.exit("error: no corpus entries match")
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            sys.exit(f"error: {e}")
+
+    results = run(names, startup=not args.no_startup, repeat=args.repeat, progress=show)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.profile:
+        profile(names, args.profile)
+        print(f"profiles written to {args.profile}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for key, old, new in regressions:
+            if new is None:
+                print(f"REGRESSION {key}: fails now, took {old * 1e6:.1f} us")
+            else:
+                print(f"REGRESSION {key}: {old * 1e6:.1f} us -> {new * 1e6:.1f} us ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
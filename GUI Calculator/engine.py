@@ -0,0 +1,593 @@
+import itertools
+import math
+import operator
+import re
+from collections import OrderedDict
+from fractions import Fraction
+
+# Expression engine for the calculator: text -> tokens -> AST -> a tree of
+# closures. Nothing here touches Tk, so it can be used and timed headless.
+#
+# The AST is made of plain tuples, which keeps nodes hashable:
+#   ("num", "2.5")            number literal, converted by the backend
+#   ("name", "x")             constant or variable
+#   ("neg", node)             unary minus
+#   ("fact", node)            postfix !
+#   ("bin", op, left, right)  + - * / ^
+#   ("call", func, node)      sin( ... ) and friends
+
+
+class ExpressionError(ValueError):
+    def __init__(self, message, position=None):
+        super().__init__(message if position is None else f"{message} at position {position}")
+        self.position = position
+
+
+class BudgetError(ExpressionError):
+    pass
+
+
+# Tokenizer
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>π|[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>[-+*/^!()×÷])
+    )""", re.VERBOSE)
+
+SYMBOLS = {"×": "*", "÷": "/"}
+
+
+class Token:
+    __slots__ = ("kind", "value", "position")
+
+    def __init__(self, kind, value, position):
+        self.kind = kind
+        self.value = value
+        self.position = position
+
+    def __repr__(self):
+        return f"<Token {self.kind} {self.value!r}>"
+
+
+def tokenize(text, start=0):
+    # Tokens from start (a token boundary) to the end of text
+    tokens = []
+    position = start
+    end = len(text.rstrip())
+    while position < end:
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise ExpressionError(f"unexpected {text[position]!r}", position)
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append(Token(kind, SYMBOLS.get(value, value), match.start(kind)))
+        position = match.end()
+    tokens.append(Token("end", None, end))
+    return tokens
+
+
+# Parser
+
+# Binary operator -> (precedence, right associative)
+BINARY = {
+    "+": (1, False),
+    "-": (1, False),
+    "*": (2, False),
+    "/": (2, False),
+    "^": (4, True),
+}
+# Unary minus binds looser than ^, so -2^2 is -4 as on paper
+UNARY = 3
+
+FUNCTIONS = ("sin", "cos", "tan", "log", "ln", "sqrt", "sqr")
+
+# Deepest nesting of brackets, right associative powers and unary signs the
+# parser descends into; the recursion stays well inside Python's own limit
+MAX_DEPTH = 128
+
+
+class Parser:
+    # Precedence climbing over the token list. Adjacent operands multiply
+    # (2π, 3(4+1), 2sin(30)), and parentheses still open at the end of the
+    # input are closed, as on a handheld calculator.
+    #
+    # groups maps the token index of each group parsed so far to its tree and
+    # the index after its ")"; given a previous parse's groups, the parser
+    # skips straight over those groups instead of parsing them again.
+
+    def __init__(self, tokens, groups=None):
+        self.tokens = tokens
+        self.index = 0
+        self.depth = 0
+        self.groups = {} if groups is None else groups
+
+    @property
+    def token(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self):
+        node = self.expression(1)
+        if self.token.kind != "end":
+            raise ExpressionError(f"unexpected {self.token.value!r}", self.token.position)
+        return node
+
+    def expression(self, min_precedence):
+        if self.depth >= MAX_DEPTH:
+            raise ExpressionError("expression is nested too deeply", self.token.position)
+        self.depth += 1
+        left = self.unary()
+        while True:
+            token = self.token
+            explicit = token.kind == "op" and token.value in BINARY
+            if explicit:
+                op = token.value
+            elif self.implicit_product():
+                op = "*"
+            else:
+                break
+            precedence, right_associative = BINARY[op]
+            if precedence < min_precedence:
+                break
+            if explicit:
+                self.advance()
+            right = self.expression(precedence if right_associative else precedence + 1)
+            left = ("bin", op, left, right)
+        self.depth -= 1
+        return left
+
+    def implicit_product(self):
+        token = self.token
+        if token.kind == "name" or token.value == "(":
+            return True
+        # A number straight after ")" or a name, but never "2 3"
+        return token.kind == "number" and self.tokens[self.index - 1].kind != "number"
+
+    def unary(self):
+        token = self.token
+        if token.kind == "op" and token.value in "+-":
+            self.advance()
+            operand = self.expression(UNARY)
+            return ("neg", operand) if token.value == "-" else operand
+        return self.postfix()
+
+    def postfix(self):
+        node = self.primary()
+        depth = self.depth
+        while self.token.value == "!" and self.token.kind == "op":
+            if depth >= MAX_DEPTH:
+                raise ExpressionError("expression is nested too deeply", self.token.position)
+            depth += 1
+            self.advance()
+            node = ("fact", node)
+        return node
+
+    def primary(self):
+        token = self.advance()
+        if token.kind == "number":
+            return ("num", token.value)
+        if token.kind == "name":
+            if token.value in FUNCTIONS:
+                if self.token.value != "(":
+                    raise ExpressionError(f"{token.value} needs a '('", self.token.position)
+                self.advance()
+                return ("call", token.value, self.group())
+            return ("name", token.value)
+        if token.value == "(":
+            return self.group()
+        if token.kind == "end":
+            raise ExpressionError("unexpected end of expression", token.position)
+        raise ExpressionError(f"unexpected {token.value!r}", token.position)
+
+    def group(self):
+        # After "(": the inner expression and its ")", which may be left off at the end
+        start = self.index
+        if start in self.groups:
+            node, self.index = self.groups[start]
+            return node
+        node = self.expression(1)
+        if self.token.value == ")":
+            self.advance()
+            # Only a closed group is final; one closed by the end may yet grow
+            self.groups[start] = (node, self.index)
+        elif self.token.kind != "end":
+            raise ExpressionError("expected ')'", self.token.position)
+        return node
+
+
+def parse(text):
+    return Parser(tokenize(text)).parse()
+
+
+# Longest run of characters a number token can need to see past its end
+# before it is complete: "1" becomes "1e+5" once "e+5" is typed
+LOOKAHEAD = 2
+
+
+class IncrementalParser:
+    # Parser for text that is edited a little at a time, such as the input
+    # line as it is typed. Tokens ending before the first changed character
+    # are kept, and so are the trees of groups closed among them.
+
+    def __init__(self):
+        self.text = ""
+        self.tokens = [Token("end", None, 0)]
+        self.groups = {}
+        self.tree = None
+
+    def tokenize(self, text):
+        if text == self.text:
+            return self.tokens
+        common = 0
+        limit = min(len(text), len(self.text))
+        while common < limit and text[common] == self.text[common]:
+            common += 1
+        kept = 0
+        while kept < len(self.tokens) - 1 and self.tokens[kept].position + len(self.tokens[kept].value) + LOOKAHEAD < common:
+            kept += 1
+        start = self.tokens[kept - 1].position + len(self.tokens[kept - 1].value) if kept else 0
+        try:
+            tokens = self.tokens[:kept] + tokenize(text, start)
+        except ExpressionError:
+            self.__init__()
+            raise
+        self.text = text
+        self.tokens = tokens
+        self.tree = None
+        self.groups = {index: group for index, group in self.groups.items() if group[1] <= kept}
+        return tokens
+
+    def parse(self, text=None):
+        # Parses text, or the text last given to tokenize()
+        if text is not None:
+            self.tokenize(text)
+        if self.tree is None:
+            self.tree = Parser(self.tokens, self.groups).parse()
+        return self.tree
+
+
+def children(node):
+    kind = node[0]
+    if kind == "bin":
+        return node[2:]
+    if kind in ("num", "name"):
+        return ()
+    return node[-1:]
+
+
+def free_names(node, backend=None):
+    # Names in the tree that are not constants of backend: the variables
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] == "name" and not (backend is not None and node[1] in backend.constants):
+            names.add(node[1])
+        stack.extend(children(node))
+    return names
+
+
+# Backends: how literals, operators, functions and constants are evaluated
+
+def parse_number(text):
+    if text.isdigit():
+        return int(text)
+    return float(text)
+
+
+def factorial(value):
+    if value < 0 or value != int(value):
+        raise ValueError("factorial needs a non-negative integer")
+    return math.factorial(int(value))
+
+
+def power(base, exponent):
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise ValueError("power has no real result")
+    return result
+
+
+class Backend:
+    def __init__(self, number, operators, functions, constants):
+        self.number = number
+        self.operators = operators
+        self.functions = functions
+        self.constants = constants
+
+
+def result_digits(operator, *operands):
+    # Rough decimal digits in the exact (integer or rational) result of !, ^,
+    # * or sqr, or 0 when the result is a float or decimal, whose size is
+    # bounded
+    try:
+        if operator == "!":
+            (value,) = operands
+            if isinstance(value, (int, Fraction)) or (isinstance(value, float) and value.is_integer()):
+                return math.lgamma(float(value) + 1) / math.log(10) if value > 1 else 1
+        elif operator in ("*", "sqr"):
+            if operator == "sqr":
+                operands *= 2
+            if all(isinstance(value, (int, Fraction)) for value in operands):
+                bits = sum(max(abs(value.numerator), value.denominator).bit_length() for value in operands)
+                return bits * math.log10(2)
+        else:
+            base, exponent = operands
+            if isinstance(base, (int, Fraction)) and isinstance(exponent, (int, Fraction)):
+                if isinstance(base, int) and isinstance(exponent, int) and exponent < 0:
+                    return 0
+                size = max(abs(base.numerator), base.denominator)
+                return abs(float(exponent)) * math.log10(size) if size > 1 else 1
+    except OverflowError:
+        return math.inf
+    return 0
+
+
+def budgeted(backend, max_digits):
+    # backend with !, ^, * and sqr refusing results longer than max_digits
+    # digits, so 9999999! or sqr(sqr(sqr(...))) fails at once instead of
+    # running for minutes
+    def check(symbol, apply):
+        def checked(*operands):
+            if result_digits(symbol, *operands) > max_digits:
+                raise BudgetError(f"result would have more than {max_digits} digits")
+            return apply(*operands)
+        return checked
+    operators = dict(backend.operators)
+    for symbol in ("!", "^", "*"):
+        operators[symbol] = check(symbol, backend.operators[symbol])
+    functions = dict(backend.functions)
+    functions["sqr"] = check("sqr", backend.functions["sqr"])
+    return Backend(backend.number, operators, functions, backend.constants)
+
+
+MATH = Backend(
+    number=parse_number,
+    operators={
+        "+": operator.add,
+        "-": operator.sub,
+        "*": operator.mul,
+        "/": operator.truediv,
+        "^": power,
+        "neg": operator.neg,
+        "!": factorial,
+    },
+    functions={
+        "sin": math.sin,
+        "cos": math.cos,
+        "tan": math.tan,
+        "log": math.log10,
+        "ln": math.log,
+        "sqrt": math.sqrt,
+        "sqr": lambda value: value * value,
+    },
+    constants={"π": math.pi, "pi": math.pi, "e": math.e},
+)
+
+
+# Compiler: each node becomes a closure taking the variables dict. Subtrees
+# without variables are computed once, at compile time, through a fold
+# callback; an engine's fold shares them between expressions. Given an intern
+# callback, fold is passed a key standing for the whole subtree: the interned
+# node with its children replaced by their own keys, so a key costs the same
+# to hash however deep the subtree is.
+
+NOT_CONSTANT = object()
+
+
+def fold_now(key, compute):
+    try:
+        return compute()
+    except (ArithmeticError, ValueError):
+        # Left for evaluation time, so the error surfaces where it belongs
+        return NOT_CONSTANT
+
+
+def build(node, backend, fold=fold_now, intern=None):
+    # -> (closure, value); value is NOT_CONSTANT unless the subtree is pure.
+    # No recursion, as a sum of a thousand terms is a tree a thousand levels
+    # deep: nodes are listed parent first, then built in reverse, children
+    # before parents, each taking its operands off the top of a stack.
+    order = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        operands = children(node)
+        order.append((node, len(operands)))
+        stack += operands
+    built = []
+    for node, arity in reversed(order):
+        if arity:
+            operands = built[-arity:]
+            del built[-arity:]
+        else:
+            operands = ()
+        built.append(build_node(node, backend, fold, intern, operands))
+    return built[0][:2]
+
+
+def chain(first, steps):
+    # Closure for first(env) followed by value = apply(value, operand(env))
+    # for each step; steps may still grow until the tree is built
+    def run(env):
+        value = first(env)
+        for apply, operand in steps:
+            value = apply(value, operand(env))
+        return value
+    run.steps = steps
+    return run
+
+
+def build_node(node, backend, fold, intern, operands):
+    # One node, given the (closure, value, key) of each child -> the same for
+    # the node; the key is None unless the value is constant
+    kind = node[0]
+    if kind == "num":
+        value = backend.number(node[1])
+        return (lambda env: value), value, node
+    if kind == "name":
+        name = node[1]
+        if name in backend.constants:
+            value = backend.constants[name]
+            return (lambda env: value), value, node
+
+        def variable(env):
+            try:
+                return env[name]
+            except KeyError:
+                raise ExpressionError(f"unknown name {name!r}") from None
+        return variable, NOT_CONSTANT, None
+    if kind == "bin":
+        apply = backend.operators[node[1]]
+        (left, left_value, left_key), (right, right_value, right_key) = operands
+        if left_value is not NOT_CONSTANT and right_value is not NOT_CONSTANT:
+            key = intern(node[:2] + (left_key, right_key)) if intern else None
+            value = fold(key, lambda: apply(left_value, right_value))
+            if value is not NOT_CONSTANT:
+                return (lambda env: value), value, key
+        # A run such as x-1-2-3 is left-deep; it is evaluated in one loop,
+        # each node adding its step to the run compiled for its left child
+        steps = getattr(left, "steps", None)
+        if steps is None:
+            return chain(left, [(apply, right)]), NOT_CONSTANT, None
+        steps.append((apply, right))
+        return left, NOT_CONSTANT, None
+    if kind == "neg":
+        apply = backend.operators["neg"]
+    elif kind == "fact":
+        apply = backend.operators["!"]
+    elif kind == "call":
+        apply = backend.functions[node[1]]
+    else:
+        raise ExpressionError(f"bad node {kind!r}")
+    ((operand, operand_value, operand_key),) = operands
+    if operand_value is not NOT_CONSTANT:
+        key = intern(node[:-1] + (operand_key,)) if intern else None
+        value = fold(key, lambda: apply(operand_value))
+        if value is not NOT_CONSTANT:
+            return (lambda env: value), value, key
+    return (lambda env: apply(operand(env))), NOT_CONSTANT, None
+
+
+def compile_node(node, backend=MATH):
+    return build(node, backend)[0]
+
+
+def compile_expression(text, backend=MATH):
+    return compile_node(parse(text), backend)
+
+
+def evaluate(text, variables=None, backend=MATH):
+    return compile_expression(text, backend)(variables or {})
+
+
+class LRUCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        return {"size": len(self.data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class Engine:
+    # Evaluator with memory. Compiled expressions are cached by their token
+    # text, so "1+2" and "1 + 2" share an entry; for a pure expression (no
+    # variables such as Ans) the entry carries the result as well. Values of
+    # pure subtrees are cached by interned key, so sin(30) is worked out once
+    # however many expressions it appears in. Keys are never reused: a node
+    # interned again after eviction gets a new one, and values cached under
+    # the old key simply age out.
+
+    def __init__(self, backend=MATH, maxsize=256):
+        self.backend = backend
+        self.compiled = LRUCache(maxsize)
+        self.subexpressions = LRUCache(maxsize * 4)
+        self.keys = LRUCache(maxsize * 16)
+        self.serials = itertools.count()
+
+    def compile(self, text, incremental=None):
+        # -> (closure, result or NOT_CONSTANT); incremental is an
+        # IncrementalParser that was given the previous version of text
+        tokens = tokenize(text) if incremental is None else incremental.tokenize(text)
+        key = " ".join(token.value for token in tokens[:-1])
+        entry = self.compiled.get(key)
+        if entry is None:
+            node = Parser(tokens).parse() if incremental is None else incremental.parse()
+            entry = build(node, self.backend, self.fold, self.intern)
+            self.compiled.put(key, entry)
+        return entry
+
+    def evaluate(self, text, variables=None, incremental=None):
+        closure, value = self.compile(text, incremental)
+        if value is not NOT_CONSTANT:
+            return value
+        return closure(variables or {})
+
+    def intern(self, shape):
+        # A node whose children are already keys -> its own key
+        key = self.keys.get(shape)
+        if key is None:
+            key = next(self.serials)
+            self.keys.put(shape, key)
+        return key
+
+    def fold(self, key, compute):
+        value = self.subexpressions.get(key, NOT_CONSTANT)
+        if value is NOT_CONSTANT:
+            value = fold_now(key, compute)
+            if value is not NOT_CONSTANT:
+                self.subexpressions.put(key, value)
+        return value
+
+    def clear(self):
+        self.compiled.clear()
+        self.subexpressions.clear()
+        self.keys.clear()
+
+    def stats(self):
+        return {
+            "compiled": self.compiled.stats(),
+            "subexpressions": self.subexpressions.stats(),
+            "keys": self.keys.stats(),
+        }
+
+
+def format_result(value):
+    # Whole floats print as integers; others are rounded to 10 places
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return round(value, 10)
+    return value
@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import time
+import tkinter as tk
+
+from engine import LRUCache
+
+# Calculation history: records appended to an SQLite table and shown in a
+# virtual list that only ever has the rows in view on screen, so it scrolls
+# the same through ten entries or a hundred thousand.
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".calculator_history.sqlite3")
+
+# Rows are only ever appended, so ids run 1, 2, ... count
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    expression TEXT NOT NULL,
+    result TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_expression ON history (expression);
+"""
+
+# Substring search goes through a trigram index where SQLite has FTS5
+TRIGRAM = """
+CREATE VIRTUAL TABLE history_text USING fts5(
+    expression, content='history', content_rowid='id', tokenize='trigram case_sensitive 1');
+CREATE TRIGGER history_text_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_text (rowid, expression) VALUES (new.id, new.expression);
+END;
+INSERT INTO history_text (history_text) VALUES ('rebuild');
+"""
+
+
+class HistoryStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.connection = sqlite3.connect(path)
+        # One small write per calculation; WAL makes each commit cheap
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        self.trigram = self.has_table("history_text")
+        if not self.trigram:
+            try:
+                with self.connection:
+                    self.connection.executescript(TRIGRAM)
+                self.trigram = True
+            except sqlite3.OperationalError:
+                pass
+        self.count = self.connection.execute("SELECT coalesce(max(id), 0) FROM history").fetchone()[0]
+
+    def has_table(self, name):
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.connection.execute(query, (name,)).fetchone() is not None
+
+    def append(self, expression, result, mode="float"):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO history (expression, result, mode, created) VALUES (?, ?, ?, ?)",
+                (expression, result, mode, time.time()))
+        self.count = cursor.lastrowid
+        return cursor.lastrowid
+
+    def fetch(self, ids):
+        # id -> (expression, result, mode) for the given ids
+        ids = list(ids)
+        if not ids:
+            return {}
+        if ids[-1] - ids[0] == len(ids) - 1:
+            query = "SELECT id, expression, result, mode FROM history WHERE id BETWEEN ? AND ?"
+            rows = self.connection.execute(query, (ids[0], ids[-1]))
+        else:
+            query = f"SELECT id, expression, result, mode FROM history WHERE id IN ({', '.join('?' * len(ids))})"
+            rows = self.connection.execute(query, ids)
+        return {row[0]: row[1:] for row in rows}
+
+    def last(self):
+        # (expression, result, mode) of the newest record, or None
+        return self.fetch([self.count]).get(self.count)
+
+    def search(self, text, prefix=False):
+        # Ids, oldest first, of the expressions starting with or containing text
+        if prefix:
+            # A range over the expression index; no character sorts after U+10FFFF
+            query = "SELECT id FROM history WHERE expression >= ? AND expression < ? ORDER BY id"
+            rows = self.connection.execute(query, (text, text + "\U0010ffff"))
+        elif self.trigram and len(text) >= 3:
+            query = "SELECT rowid FROM history_text WHERE history_text MATCH ? ORDER BY rowid"
+            rows = self.connection.execute(query, ('"' + text.replace('"', '""') + '"',))
+        else:
+            # Too short for trigrams: a scan, still quick in SQLite
+            rows = self.connection.execute("SELECT id FROM history WHERE instr(expression, ?) > 0 ORDER BY id", (text,))
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+class HistoryList:
+    # The store, or the results of a search in it, as a list of clickable
+    # rows on a Canvas. One text item per visible row is kept and re-texted
+    # as the list scrolls; records are read from the store only for rows
+    # coming into view, and cached.
+
+    ROW = 20
+
+    def __init__(self, parent, store, theme, pick):
+        self.store = store
+        self.pick = pick
+        self.ids = None
+        self.query = None
+        self.top = 0
+        # Keep the newest entry in view until the user scrolls up
+        self.follow = True
+        self.records = LRUCache(1024)
+        self.items = []
+
+        self.frame = tk.Frame(parent)
+        self.frame.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.scrolled)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.frame, highlightthickness=0, width=200, height=300)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.set_colors(theme)
+
+        self.canvas.bind("<Configure>", lambda event: self.scroll_to(self.top))
+        self.canvas.bind("<Button-1>", self.clicked)
+        self.canvas.bind("<MouseWheel>", lambda event: self.scroll_to(self.top - event.delta // 40))
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))
+
+    def set_colors(self, theme):
+        self.frame.config(bg=theme["bg"])
+        self.canvas.config(bg=theme["display_bg"])
+
+    def __len__(self):
+        return self.store.count if self.ids is None else len(self.ids)
+
+    def visible(self):
+        return max(1, self.canvas.winfo_height() // self.ROW)
+
+    def id_at(self, index):
+        return index + 1 if self.ids is None else self.ids[index]
+
+    def append(self, expression, result, mode="float"):
+        record_id = self.store.append(expression, result, mode)
+        self.records.put(record_id, (expression, result, mode))
+        if self.ids is not None and self.matches(expression):
+            self.ids.append(record_id)
+        if self.follow:
+            self.scroll_to(len(self))
+        else:
+            self.update_scrollbar()
+
+    def search(self, text, prefix=False):
+        if text:
+            self.ids = self.store.search(text, prefix)
+            self.query = (text, prefix)
+        else:
+            self.ids = self.query = None
+        self.scroll_to(len(self))
+
+    def matches(self, expression):
+        text, prefix = self.query
+        return expression.startswith(text) if prefix else text in expression
+
+    # Scrolling
+
+    def scrolled(self, action, amount, unit=None):
+        # Scrollbar command: ("moveto", fraction) or ("scroll", n, "units" / "pages")
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self)))
+        elif unit == "pages":
+            self.scroll_to(self.top + int(amount) * self.visible())
+        else:
+            self.scroll_to(self.top + int(amount))
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, len(self) - self.visible()))
+        self.follow = self.top + self.visible() >= len(self)
+        self.draw()
+
+    def update_scrollbar(self):
+        count = len(self)
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + self.visible()) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # Drawing: only the rows in view
+
+    def draw(self):
+        visible = self.visible()
+        while len(self.items) < visible:
+            y = len(self.items) * self.ROW + 2
+            self.items.append(self.canvas.create_text(4, y, anchor=tk.NW, font=("Arial", 10, "underline"), fill="blue"))
+        while len(self.items) > visible:
+            self.canvas.delete(self.items.pop())
+        indexes = range(self.top, min(self.top + visible, len(self)))
+        ids = [self.id_at(index) for index in indexes]
+        missing = [record_id for record_id in ids if self.records.get(record_id) is None]
+        for record_id, record in self.store.fetch(missing).items():
+            self.records.put(record_id, record)
+        for item, record_id in zip(self.items, ids):
+            expression, result, _ = self.records.get(record_id, ("", "", None))
+            text = f"{expression} = {result}"
+            # A 10000 digit result would only be clipped by the canvas anyway
+            self.canvas.itemconfig(item, text=text if len(text) <= 80 else text[:79] + "…")
+        for item in self.items[len(ids):]:
+            self.canvas.itemconfig(item, text="")
+        self.update_scrollbar()
+
+    def clicked(self, event):
+        index = self.top + event.y // self.ROW
+        if index < len(self):
+            record = self.records.get(self.id_at(index))
+            if record is not None:
+                self.pick(record[0])
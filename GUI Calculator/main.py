@@ -1,9 +1,18 @@
+import argparse
 import tkinter as tk
-from tkinter import ttk, scrolledtext
-import math
+from tkinter import ttk
+from engine import MATH, Engine, ExpressionError, IncrementalParser, budgeted, format_result, free_names
+from history import DEFAULT_PATH, HistoryList, HistoryStore
+from plot import PlotPanel
+from precision import MODES, coerce, read_value
+from theme import LIGHT, ThemeRegistry, load_themes
+from worker import Evaluator, needs_worker
 
 class CalculatorApp:
-    def __init__(self, root):
+    # Pause in typing, in milliseconds, before the preview is worked out
+    PREVIEW_MS = 100
+    
+    def __init__(self, root, timeout=5.0, max_digits=10000, history_path=DEFAULT_PATH):
         self.root = root
         self.root.title("Scientific Calculator")
         self.root.geometry("800x500")
@@ -11,80 +20,99 @@ class CalculatorApp:
         
         # Variables
         self.current_input = ""
-        self.history = []
-        self.is_dark_mode = False
-        
-        # Define colors for themes
-        self.light_theme = {
-            "bg": "#f0f0f0",
-            "fg": "#000000",
-            "button_bg": "#e1e1e1",
-            "button_fg": "#000000",
-            "display_bg": "#ffffff",
-            "display_fg": "#000000",
-            "op_button_bg": "#d0d0ff",
-            "sci_button_bg": "#ffe0d0",
-            "highlight_bg": "#90caf9"
-        }
-        
-        self.dark_theme = {
-            "bg": "#2d2d2d",
-            "fg": "#ffffff",
-            "button_bg": "#3d3d3d",
-            "button_fg": "#ffffff",
-            "display_bg": "#1e1e1e",
-            "display_fg": "#ffffff",
-            "op_button_bg": "#4040aa",
-            "sci_button_bg": "#aa4040",
-            "highlight_bg": "#0d47a1"
-        }
-        
-        self.current_theme = self.light_theme
+        self.last_answer = 0
+        # Every calculation is kept on disk; Ans carries over between sessions
+        self.history_store = HistoryStore(history_path)
+        last = self.history_store.last()
+        if last is not None:
+            try:
+                self.last_answer = read_value(last[1], last[2])
+            except (ArithmeticError, ValueError):
+                pass
+        self.search_job = None
+        # Caches compiled expressions, so re-running history entries is cheap.
+        # Products can grow big integers too, so it keeps the worker's limit.
+        self.engine = Engine(budgeted(MATH, max_digits))
+        # Big integer work (!, ^) runs in a worker process within these limits
+        self.evaluator = Evaluator(timeout, max_digits)
+        self.busy_ticks = 0
+        # Live preview: the input is re-parsed from the first edited token on,
+        # and anything expensive is previewed in a worker of its own
+        self.incremental = IncrementalParser()
+        self.previewer = Evaluator(min(timeout, 1.0), max_digits)
+        self.preview_job = None
+        self.graph_mode = False
+        
+        # Colours by widget role; themes are Light, Dark and any files in themes/
+        self.styles = ThemeRegistry(self.root, LIGHT)
+        self.themes = {name: colors for name, colors in load_themes().items() if self.styles.valid(colors)}
         
         # Create main frames
         self.create_frames()
         self.create_display()
         self.create_buttons()
         self.create_history_panel()
+        self.create_graph_panel()
         self.create_theme_toggle()
+        self.create_precision_controls()
         
         # Set up key bindings
         self.setup_keyboard_bindings()
+        
+        # Start the worker once the window is up, not before the first frame
+        self.root.after_idle(self.evaluator.start)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
     
     def create_frames(self):
         # Main container with two columns
-        self.main_container = tk.Frame(self.root, bg=self.current_theme["bg"])
+        self.main_container = self.styles.add(tk.Frame(self.root), "frame")
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Left frame for calculator
-        self.calculator_frame = tk.Frame(self.main_container, bg=self.current_theme["bg"])
+        self.calculator_frame = self.styles.add(tk.Frame(self.main_container), "frame")
         self.calculator_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         # Right frame for history
-        self.history_frame = tk.Frame(self.main_container, bg=self.current_theme["bg"], width=200)
+        self.history_frame = self.styles.add(tk.Frame(self.main_container, width=200), "frame")
         self.history_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(10, 0))
         
         # Display frame
-        self.display_frame = tk.Frame(self.calculator_frame, bg=self.current_theme["bg"])
+        self.display_frame = self.styles.add(tk.Frame(self.calculator_frame), "frame")
         self.display_frame.pack(fill=tk.X, pady=(0, 10))
         
         # Buttons frame
-        self.buttons_frame = tk.Frame(self.calculator_frame, bg=self.current_theme["bg"])
+        self.buttons_frame = self.styles.add(tk.Frame(self.calculator_frame), "frame")
         self.buttons_frame.pack(fill=tk.BOTH, expand=True)
     
     def create_display(self):
         # Input display
-        self.display = tk.Entry(
+        self.display = self.styles.add(tk.Entry(
             self.display_frame, 
             font=("Arial", 24),
             bd=10,
-            justify=tk.RIGHT,
-            bg=self.current_theme["display_bg"],
-            fg=self.current_theme["display_fg"]
-        )
+            justify=tk.RIGHT
+        ), "display")
         self.display.pack(fill=tk.BOTH, expand=True)
         self.display.insert(0, "0")
         self.display.config(state="readonly")
+        
+        # Live result of the expression being typed
+        self.preview_label = self.styles.add(tk.Label(
+            self.display_frame,
+            text="",
+            font=("Arial", 12),
+            anchor=tk.E
+        ), "text")
+        self.preview_label.pack(fill=tk.X)
+        
+        # Status line: busy indicator and error details
+        self.status_label = self.styles.add(tk.Label(
+            self.display_frame,
+            text="",
+            font=("Arial", 10),
+            anchor=tk.E
+        ), "text")
+        self.status_label.pack(fill=tk.X)
     
     def create_buttons(self):
         # Create grid for calculator buttons
@@ -101,19 +129,19 @@ class CalculatorApp:
         ]
         
         for col, (text, command) in enumerate(sci_buttons):
-            self.create_button(text, command, 0, col, is_science=True)
+            self.create_button(text, command, 0, col, role="science")
         
         # More scientific buttons (second row)
         sci_buttons2 = [
             ("√", lambda: self.add_scientific_function("sqrt(")),
             ("^", lambda: self.add_operator("^")),
-            ("π", lambda: self.add_constant(math.pi)),
-            ("e", lambda: self.add_constant(math.e)),
+            ("π", lambda: self.add_constant("π")),
+            ("e", lambda: self.add_constant("e")),
             ("!", lambda: self.add_operator("!"))
         ]
         
         for col, (text, command) in enumerate(sci_buttons2):
-            self.create_button(text, command, 1, col, is_science=True)
+            self.create_button(text, command, 1, col, role="science")
         
         # Parentheses and clear buttons (third row)
         special_buttons = [
@@ -125,8 +153,8 @@ class CalculatorApp:
         ]
         
         for col, (text, command) in enumerate(special_buttons):
-            is_op = text in "÷"
-            self.create_button(text, command, 2, col, is_operation=is_op)
+            role = "operation" if text in "÷" else "button"
+            self.create_button(text, command, 2, col, role=role)
         
         # Numbers and operations
         buttons = [
@@ -148,8 +176,8 @@ class CalculatorApp:
         
         row, col = 3, 0
         for text, command in buttons:
-            is_op = text in "×-+"
-            self.create_button(text, command, row, col, is_operation=is_op)
+            role = "operation" if text in "×-+" else "button"
+            self.create_button(text, command, row, col, role=role)
             col += 1
             if col > 3:
                 col = 0
@@ -158,88 +186,146 @@ class CalculatorApp:
         # Last row
         self.create_button("0", lambda: self.add_to_input("0"), 6, 0, colspan=2)
         self.create_button(".", lambda: self.add_to_input("."), 6, 2)
-        self.create_button("=", self.calculate, 6, 3, is_operation=True)
+        self.create_button("=", self.calculate, 6, 3, role="operation")
         
         # Put division and multiplication in column 4
         self.create_button("DEL", self.delete_last, 3, 4)
-        self.create_button("1/x", lambda: self.add_scientific_function("1/("), 4, 4, is_science=True)
-        self.create_button("x²", lambda: self.add_scientific_function("sqr("), 5, 4, is_science=True)
+        self.create_button("1/x", lambda: self.add_scientific_function("1/("), 4, 4, role="science")
+        self.create_button("x²", lambda: self.add_scientific_function("sqr("), 5, 4, role="science")
         self.create_button("Ans", self.use_last_answer, 6, 4)
     
-    def create_button(self, text, command, row, column, colspan=1, rowspan=1, is_operation=False, is_science=False):
-        if is_operation:
-            bg_color = self.current_theme["op_button_bg"]
-        elif is_science:
-            bg_color = self.current_theme["sci_button_bg"]
-        else:
-            bg_color = self.current_theme["button_bg"]
-            
+    def create_button(self, text, command, row, column, colspan=1, rowspan=1, role="button"):
+        # role is "button", "operation" or "science" and picks the colours
         button = tk.Button(
             self.buttons_frame,
             text=text,
             font=("Arial", 12, "bold"),
             bd=3,
             relief=tk.RAISED,
-            bg=bg_color,
-            fg=self.current_theme["button_fg"],
             command=command
         )
+        self.styles.add(button, role)
         button.grid(row=row, column=column, columnspan=colspan, rowspan=rowspan, 
                    sticky="nsew", padx=2, pady=2)
     
     def create_history_panel(self):
         # Add a label
-        history_label = tk.Label(
+        history_label = self.styles.add(tk.Label(
             self.history_frame,
             text="Calculation History",
-            font=("Arial", 12, "bold"),
-            bg=self.current_theme["bg"],
-            fg=self.current_theme["fg"]
-        )
+            font=("Arial", 12, "bold")
+        ), "text")
         history_label.pack(pady=(0, 5))
         
-        # Create scrolled text widget for history
-        self.history_display = scrolledtext.ScrolledText(
-            self.history_frame,
-            width=25,
-            height=15,
-            font=("Arial", 10),
-            bg=self.current_theme["display_bg"],
-            fg=self.current_theme["display_fg"],
-            wrap=tk.WORD
-        )
-        self.history_display.pack(fill=tk.BOTH, expand=True)
-        self.history_display.config(state=tk.DISABLED)
-        
-        # Bind click event on history items
-        self.history_display.tag_config("clickable", foreground="blue", underline=1)
-        self.history_display.bind("<Button-1>", self.history_clicked)
+        # Search over all past expressions
+        self.search_frame = self.styles.add(tk.Frame(self.history_frame), "frame")
+        self.search_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        self.search_text = tk.StringVar()
+        self.search_text.trace_add("write", lambda *args: self.schedule_search())
+        self.search_entry = self.styles.add(tk.Entry(
+            self.search_frame,
+            textvariable=self.search_text,
+            width=15,
+            font=("Arial", 10)
+        ), "display")
+        # Keys typed here are not calculator input
+        self.search_entry.bindtags((str(self.search_entry), "Entry", "all"))
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        self.search_prefix = tk.BooleanVar(value=False)
+        self.prefix_button = self.styles.add(tk.Checkbutton(
+            self.search_frame,
+            text="Starts with",
+            variable=self.search_prefix,
+            command=self.search_history,
+            font=("Arial", 10)
+        ), "text")
+        self.prefix_button.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Only the rows in view are drawn; clicking one reuses its expression
+        self.history_list = HistoryList(self.history_frame, self.history_store, self.styles.theme, self.history_picked)
+        self.styles.watch(self.history_list.set_colors)
     
     def create_theme_toggle(self):
         # Create a frame for the toggle
-        toggle_frame = tk.Frame(self.calculator_frame, bg=self.current_theme["bg"])
+        toggle_frame = self.styles.add(tk.Frame(self.calculator_frame), "frame")
         toggle_frame.pack(fill=tk.X, pady=(10, 0))
         
         # Add a label
-        theme_label = tk.Label(
+        theme_label = self.styles.add(tk.Label(
             toggle_frame,
             text="Theme:",
-            font=("Arial", 10),
-            bg=self.current_theme["bg"],
-            fg=self.current_theme["fg"]
-        )
+            font=("Arial", 10)
+        ), "text")
         theme_label.pack(side=tk.LEFT, padx=(0, 5))
         
-        # Create the toggle button
-        self.theme_button = tk.Button(
+        # Pick a theme
+        self.theme_name = tk.StringVar(value="Light")
+        self.theme_menu = self.styles.add(tk.OptionMenu(toggle_frame, self.theme_name, *self.themes, command=self.set_theme), "button")
+        self.theme_menu.config(font=("Arial", 10))
+        self.theme_menu.pack(side=tk.LEFT)
+        
+        # Graph mode swaps the history panel for a plot of f(x)
+        self.graph_button = self.styles.add(tk.Button(
             toggle_frame,
-            text="Switch to Dark Mode",
+            text="Show Graph",
             font=("Arial", 10),
-            command=self.toggle_theme,
-            bg=self.current_theme["button_bg"],
-            fg=self.current_theme["button_fg"]
-        )
-        self.theme_button.pack(side=tk.LEFT)
+            command=self.toggle_graph
+        ), "button")
+        self.graph_button.pack(side=tk.LEFT, padx=(5, 0))
+    
+    def create_precision_controls(self):
+        # Arithmetic mode, and significant digits for decimal mode
+        self.precision_frame = self.styles.add(tk.Frame(self.calculator_frame), "frame")
+        self.precision_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        mode_label = self.styles.add(tk.Label(
+            self.precision_frame,
+            text="Mode:",
+            font=("Arial", 10)
+        ), "text")
+        mode_label.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.mode = tk.StringVar(value="float")
+        self.mode_menu = self.styles.add(tk.OptionMenu(self.precision_frame, self.mode, *MODES), "button")
+        self.mode_menu.config(font=("Arial", 10))
+        self.mode_menu.pack(side=tk.LEFT)
+        
+        digits_label = self.styles.add(tk.Label(
+            self.precision_frame,
+            text="Digits:",
+            font=("Arial", 10)
+        ), "text")
+        digits_label.pack(side=tk.LEFT, padx=(10, 5))
+        
+        self.digits = self.styles.add(tk.Spinbox(
+            self.precision_frame,
+            from_=10,
+            to=5000,
+            increment=10,
+            width=6,
+            font=("Arial", 10)
+        ), "display")
+        self.digits.delete(0, tk.END)
+        self.digits.insert(0, "50")
+        self.digits.pack(side=tk.LEFT)
+        # Typing digits here must not also enter them into the calculation
+        self.digits.bindtags((str(self.digits), "Spinbox", "all"))
+    
+    def precision(self):
+        # -> (mode, digits); digits out of range or unreadable fall back to 50
+        try:
+            digits = min(max(int(self.digits.get()), 10), 5000)
+        except ValueError:
+            digits = 50
+        return self.mode.get(), digits
+    
+    def create_graph_panel(self):
+        # Packed in place of the history frame by toggle_graph
+        self.graph_frame = self.styles.add(tk.Frame(self.main_container), "frame")
+        self.plot = PlotPanel(self.graph_frame, self.styles.theme)
+        self.styles.watch(self.plot.set_colors)
     
     def setup_keyboard_bindings(self):
         # Number keys
@@ -258,6 +344,9 @@ class CalculatorApp:
         self.root.bind("(", lambda event: self.add_to_input("("))
         self.root.bind(")", lambda event: self.add_to_input(")"))
         
+        # Variable for graph mode
+        self.root.bind("x", lambda event: self.add_to_input("x"))
+        
         # Calculate
         self.root.bind("<Return>", lambda event: self.calculate())
         self.root.bind("<KP_Enter>", lambda event: self.calculate())
@@ -265,6 +354,9 @@ class CalculatorApp:
         # Clear and delete
         self.root.bind("<BackSpace>", lambda event: self.delete_last())
         self.root.bind("<Delete>", lambda event: self.clear_all())
+        
+        # Cancel a long calculation
+        self.root.bind("<Escape>", lambda event: self.cancel_calculation())
     
     def add_to_input(self, char):
         if self.current_input == "0" and char in "0123456789":
@@ -282,11 +374,13 @@ class CalculatorApp:
         self.current_input += func
         self.update_display()
     
-    def add_constant(self, value):
-        if self.current_input and self.current_input[-1].isdigit():
-            self.current_input += "*" + str(value)
+    def add_constant(self, symbol):
+        # After a number, a name (π included) or ")" it multiplies; "Ans"
+        # then "e" must not run together into the name "Anse"
+        if self.current_input and (self.current_input[-1].isalnum() or self.current_input[-1] == ")"):
+            self.current_input += "*" + symbol
         else:
-            self.current_input += str(value)
+            self.current_input += symbol
         self.update_display()
     
     def clear_last(self):
@@ -294,6 +388,7 @@ class CalculatorApp:
         self.update_display()
     
     def clear_all(self):
+        self.cancel_calculation()
         self.clear_last()
     
     def delete_last(self):
@@ -304,13 +399,9 @@ class CalculatorApp:
             self.update_display()
     
     def use_last_answer(self):
-        if len(self.history) > 0:
-            last_result = self.history[-1].split(" = ")[1]
-            if self.current_input and self.current_input[-1].isdigit():
-                self.current_input += "*" + last_result
-            else:
-                self.current_input += last_result
-            self.update_display()
+        if self.history_store.count > 0:
+            # Inserted as a name; the engine looks up the last result
+            self.add_constant("Ans")
     
     def update_display(self):
         self.display.config(state=tk.NORMAL)
@@ -318,6 +409,55 @@ class CalculatorApp:
         display_text = self.current_input if self.current_input else "0"
         self.display.insert(0, display_text)
         self.display.config(state="readonly")
+        self.schedule_preview()
+    
+    def variables(self, mode):
+        # Ans in the type the given mode calculates with
+        return {"Ans": coerce(self.last_answer, "float") if mode == "float" else self.last_answer}
+    
+    def schedule_preview(self):
+        # Each edit restarts the wait and drops a preview still running
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.previewer.cancel()
+        self.preview_job = self.root.after(self.PREVIEW_MS, self.preview)
+    
+    def preview(self):
+        self.preview_job = None
+        expression = self.current_input
+        mode, digits = self.precision()
+        variables = self.variables(mode)
+        try:
+            node = self.incremental.parse(expression)
+        except (ExpressionError, RecursionError):
+            # Usually just unfinished
+            self.show_preview(None, None, None)
+            return
+        if node[0] == "num" or (self.graph_mode and "x" in free_names(node)):
+            self.show_preview(None, None, None)
+            return
+        if mode != "float" or needs_worker(node, variables):
+            self.previewer.submit(expression, variables, self.show_preview, mode, digits)
+            self.poll_preview()
+            return
+        try:
+            result = format_result(self.engine.evaluate(expression, variables, self.incremental))
+            text = str(result)
+        except Exception:
+            self.show_preview(None, None, None)
+            return
+        self.show_preview(result, text, None)
+    
+    def poll_preview(self):
+        if self.previewer.poll():
+            self.root.after(20, self.poll_preview)
+    
+    def show_preview(self, value, text, error):
+        if error is not None or text is None or text == self.current_input:
+            text = ""
+        elif len(text) > 40:
+            text = text[:39] + "…"
+        self.preview_label.config(text=f"= {text}" if text else "")
     
     def calculate(self):
         if not self.current_input:
@@ -326,152 +466,108 @@ class CalculatorApp:
         # Store the expression
         expression = self.current_input
         
+        # In graph mode a function of x is plotted rather than evaluated
+        if self.graph_mode and self.plot.plots(expression):
+            self.plot.set_expression(expression, {"Ans": coerce(self.last_answer, "float")})
+            return
+        
+        # Decimal and fraction arithmetic always runs in the worker
+        mode, digits = self.precision()
+        variables = self.variables(mode)
+        self.status_label.config(text="")
+        if mode != "float" or needs_worker(expression, variables):
+            self.evaluator.submit(expression, variables,
+                                  lambda value, text, error: self.finish_calculation(expression, value, text, error, mode),
+                                  mode, digits)
+            self.busy_ticks = 0
+            self.root.config(cursor="watch")
+            self.poll_calculation()
+            return
+        
         try:
-            # Handle special functions and operations
-            expr = expression.replace("^", "**")
-            expr = expr.replace("sqrt(", "math.sqrt(")
-            expr = expr.replace("sin(", "math.sin(")
-            expr = expr.replace("cos(", "math.cos(")
-            expr = expr.replace("tan(", "math.tan(")
-            expr = expr.replace("log(", "math.log10(")
-            expr = expr.replace("ln(", "math.log(")
-            expr = expr.replace("sqr(", "((")
-            expr = expr.replace("π", str(math.pi))
-            expr = expr.replace("e", str(math.e))
-            
-            # Handle factorial
-            if "!" in expr:
-                parts = expr.split("!")
-                num_str = parts[0]
-                # Find the last number or expression
-                i = len(num_str) - 1
-                while i >= 0 and (num_str[i].isdigit() or num_str[i] == '.'):
-                    i -= 1
-                i += 1
-                num = float(num_str[i:])
-                if num.is_integer() and num >= 0:
-                    result = math.factorial(int(num))
-                    expr = num_str[:i] + str(result) + "".join(parts[1:])
-            
-            # Calculate the result
-            result = eval(expr)
-            
-            # Format the result
-            if isinstance(result, float):
-                if result.is_integer():
-                    result = int(result)
-                else:
-                    result = round(result, 10)
-            
-            # Update display with result
-            self.current_input = str(result)
-            self.update_display()
-            
-            # Add to history
-            history_entry = f"{expression} = {result}"
-            self.history.append(history_entry)
-            
-            # Update history display
-            self.update_history_display()
-            
+            # Tokenized, parsed and compiled by engine.py; no eval()
+            result = format_result(self.engine.evaluate(expression, variables, self.incremental))
+            # Past 4300 digits str() refuses
+            text = str(result)
         except Exception as e:
+            self.finish_calculation(expression, None, None, str(e))
+            return
+        self.finish_calculation(expression, result, text, None)
+    
+    def poll_calculation(self):
+        if self.evaluator.poll():
+            self.busy_ticks += 1
+            dots = "." * (self.busy_ticks // 10 % 4)
+            self.status_label.config(text=f"Calculating{dots:<3}  (Esc to cancel)")
+            self.root.after(20, self.poll_calculation)
+    
+    def cancel_calculation(self):
+        if self.evaluator.busy:
+            self.evaluator.cancel()
+            self.root.config(cursor="")
+            self.status_label.config(text="Cancelled")
+    
+    def finish_calculation(self, expression, result, text, error, mode="float"):
+        self.root.config(cursor="")
+        if error is not None:
             self.current_input = "Error"
             self.update_display()
-    
-    def update_history_display(self):
-        self.history_display.config(state=tk.NORMAL)
-        self.history_display.delete(1.0, tk.END)
-        
-        # Limit history to the most recent 20 entries
-        if len(self.history) > 20:
-            self.history = self.history[-20:]
-        
-        for entry in self.history:
-            self.history_display.insert(tk.END, entry + "\n", "clickable")
-        
-        self.history_display.config(state=tk.DISABLED)
-        self.history_display.see(tk.END)  # Scroll to the bottom
-    
-    def history_clicked(self, event):
-        # Get the index of the click
-        index = self.history_display.index(f"@{event.x},{event.y}")
-        line = int(float(index))
-        
-        # Find the corresponding history entry if it exists
-        if 0 <= line - 1 < len(self.history):
-            entry = self.history[line - 1]
-            parts = entry.split(" = ")
-            if len(parts) == 2:
-                expression = parts[0]
-                self.current_input = expression
-                self.update_display()
-    
-    def toggle_theme(self):
-        # Switch between light and dark mode
-        self.is_dark_mode = not self.is_dark_mode
-        self.current_theme = self.dark_theme if self.is_dark_mode else self.light_theme
-        
-        # Update button text
-        if self.is_dark_mode:
-            self.theme_button.config(text="Switch to Light Mode")
-        else:
-            self.theme_button.config(text="Switch to Dark Mode")
-        
-        # Update all UI elements with the new theme
-        self.update_theme()
-    
-    def update_theme(self):
-        # Update main container
-        self.main_container.config(bg=self.current_theme["bg"])
-        self.calculator_frame.config(bg=self.current_theme["bg"])
-        self.history_frame.config(bg=self.current_theme["bg"])
-        self.display_frame.config(bg=self.current_theme["bg"])
-        self.buttons_frame.config(bg=self.current_theme["bg"])
-        
-        # Update display
-        self.display.config(
-            bg=self.current_theme["display_bg"],
-            fg=self.current_theme["display_fg"]
-        )
+            self.status_label.config(text=error)
+            return
+        self.status_label.config(text="")
+        self.last_answer = result
         
-        # Update buttons
-        for widget in self.buttons_frame.winfo_children():
-            if isinstance(widget, tk.Button):
-                # Determine button type (operation, science, or normal)
-                text = widget["text"]
-                if text in "+-×÷=":
-                    bg_color = self.current_theme["op_button_bg"]
-                elif text in ["sin", "cos", "tan", "log", "ln", "√", "^", "π", "e", "!", "x²", "1/x"]:
-                    bg_color = self.current_theme["sci_button_bg"]
-                else:
-                    bg_color = self.current_theme["button_bg"]
-                
-                widget.config(
-                    bg=bg_color,
-                    fg=self.current_theme["button_fg"]
-                )
-        
-        # Update history panel
-        for widget in self.history_frame.winfo_children():
-            if isinstance(widget, tk.Label):
-                widget.config(
-                    bg=self.current_theme["bg"],
-                    fg=self.current_theme["fg"]
-                )
-        
-        self.history_display.config(
-            bg=self.current_theme["display_bg"],
-            fg=self.current_theme["display_fg"]
-        )
+        # Update display with result
+        self.current_input = text
+        self.update_display()
         
-        # Update theme toggle button
-        self.theme_button.config(
-            bg=self.current_theme["button_bg"],
-            fg=self.current_theme["button_fg"]
-        )
+        # Add to history
+        self.history_list.append(expression, text, mode)
+    
+    def history_picked(self, expression):
+        self.current_input = expression
+        self.update_display()
+    
+    def schedule_search(self):
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(150, self.search_history)
+    
+    def search_history(self):
+        self.search_job = None
+        self.history_list.search(self.search_text.get(), self.search_prefix.get())
+    
+    def set_theme(self, name):
+        # One script recolours every registered widget
+        self.styles.apply(self.themes[name])
+    
+    def close(self):
+        self.evaluator.close()
+        self.previewer.close()
+        self.history_store.close()
+        self.root.destroy()
+    
+    def toggle_graph(self):
+        self.graph_mode = not self.graph_mode
+        if self.graph_mode:
+            self.history_frame.pack_forget()
+            self.graph_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+            self.graph_button.config(text="Show History")
+            if self.plot.plots(self.current_input):
+                self.plot.set_expression(self.current_input, {"Ans": coerce(self.last_answer, "float")})
+        else:
+            self.graph_frame.pack_forget()
+            self.history_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(10, 0))
+            self.graph_button.config(text="Show Graph")
 
 # Main application
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scientific calculator")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds before a calculation is abandoned")
+    parser.add_argument("--max-digits", type=int, default=10000, help="largest integer result, in digits")
+    parser.add_argument("--history", default=DEFAULT_PATH, help="history database file (:memory: to keep none)")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = CalculatorApp(root)
+    app = CalculatorApp(root, args.timeout, args.max_digits, args.history)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,259 @@
+import time
+import tkinter as tk
+
+from batch import VECTOR, evaluate_batch, numpy
+from engine import Engine, ExpressionError, free_names, parse
+
+# Graph of f(x) for the calculator. Sampling is adaptive: a coarse pass, then
+# rounds that split only the segments where the curve leaves its chord by
+# more than a fraction of a pixel, each round one batched NumPy evaluation.
+
+
+def refine(f, xs, ys, scale_x, scale_y, tolerance=0.5, max_points=20000, rounds=12):
+    # scale_* are pixels per unit; segments narrower than a pixel are final
+    with numpy.errstate(all="ignore"):
+        candidates = numpy.diff(xs) * scale_x > 1
+        for _ in range(rounds):
+            index = numpy.flatnonzero(candidates)
+            if not index.size or len(xs) >= max_points:
+                break
+            mid_x = (xs[index] + xs[index + 1]) / 2
+            mid_y = f(mid_x)
+            error = numpy.abs(mid_y - (ys[index] + ys[index + 1]) / 2) * scale_y
+            # Undefined or infinite somewhere counts as bent, which homes in on
+            # the edge of the domain or a pole; undefined throughout does not
+            split = ~(error <= tolerance) & ~(numpy.isnan(mid_y) & numpy.isnan(ys[index]) & numpy.isnan(ys[index + 1]))
+            if not split.any():
+                break
+            count = len(xs)
+            merged_x = numpy.concatenate([xs, mid_x[split]])
+            order = numpy.argsort(merged_x, kind="stable")
+            xs = merged_x[order]
+            ys = numpy.concatenate([ys, mid_y[split]])[order]
+            fresh = order >= count
+            candidates = (fresh[:-1] | fresh[1:]) & (numpy.diff(xs) * scale_x > 1)
+    return xs, ys
+
+
+def sample(f, lo, hi, scale_x, scale_y, tolerance=0.5):
+    # One point every 8 pixels to start with, then refine
+    xs = numpy.linspace(lo, hi, max(2, int((hi - lo) * scale_x / 8) + 2))
+    return refine(f, xs, f(xs), scale_x, scale_y, tolerance)
+
+
+class PlotPanel:
+    # f(x) on a Canvas. Samples are cached per expression. Dragging or
+    # zooming first transforms the polyline already on the canvas
+    # (canvas.move / canvas.scale, no Python per point); once the pointer
+    # rests, only the x range that came into view is sampled, the part that
+    # was zoomed into is refined, and the curve is redrawn from the cache.
+
+    SETTLE_MS = 60
+    FRAME_MS = 16
+
+    def __init__(self, parent, theme):
+        self.canvas = tk.Canvas(parent, highlightthickness=0, width=300, height=300)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.engine = Engine(VECTOR) if numpy is not None else None
+        self.expression = None
+        self.variables = {}
+        self.view = [-10.0, 10.0, -10.0, 10.0]
+        self.xs = self.ys = None
+        # Pixels per unit the cached samples were refined for
+        self.sampled_scale = (0.0, 0.0)
+        self.tolerance = 0.5
+        self.redraw_ms = 0.0
+        self.drag = None
+        self.settle = None
+        self.error = None
+        self.set_colors(theme)
+
+        self.canvas.bind("<Configure>", lambda event: self.schedule(0))
+        self.canvas.bind("<ButtonPress-1>", self.start_drag)
+        self.canvas.bind("<B1-Motion>", self.dragged)
+        self.canvas.bind("<ButtonRelease-1>", lambda event: self.schedule(0))
+        self.canvas.bind("<Double-Button-1>", lambda event: self.reset_view())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event, 0.8 if event.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event, 0.8))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event, 1.25))
+
+    def set_colors(self, theme):
+        self.colors = theme
+        self.canvas.config(bg=theme["display_bg"])
+        self.canvas.itemconfig("curve", fill=theme["highlight_bg"])
+        self.canvas.itemconfig("axes", fill=theme["display_fg"])
+
+    def plots(self, text):
+        # Whether text is a function of x, i.e. something to graph
+        try:
+            return "x" in free_names(parse(text))
+        except ExpressionError:
+            return False
+
+    def set_expression(self, text, variables=None):
+        self.expression = None
+        self.xs = self.ys = None
+        self.error = None
+        if numpy is None:
+            self.error = "Graph mode needs NumPy"
+        else:
+            try:
+                unknown = free_names(parse(text), VECTOR) - {"x"} - set(variables or ())
+                if unknown:
+                    raise ExpressionError(f"unknown name {sorted(unknown)[0]!r}")
+                self.expression = text
+                self.variables = dict(variables or ())
+            except ExpressionError as e:
+                self.error = str(e)
+        self.schedule(0)
+
+    def f(self, xs):
+        return evaluate_batch(self.expression, dict(self.variables, x=xs), self.engine)
+
+    def size(self):
+        return max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height())
+
+    def scales(self):
+        width, height = self.size()
+        x0, x1, y0, y1 = self.view
+        return width / (x1 - x0), height / (y1 - y0)
+
+    def schedule(self, delay=SETTLE_MS):
+        if self.settle is not None:
+            self.canvas.after_cancel(self.settle)
+        self.settle = self.canvas.after(delay, self.update)
+
+    # Interaction: transform what is drawn now, resample when the pointer rests
+
+    def start_drag(self, event):
+        self.drag = (event.x, event.y)
+
+    def dragged(self, event):
+        if self.drag is None:
+            return
+        dx, dy = event.x - self.drag[0], event.y - self.drag[1]
+        self.drag = (event.x, event.y)
+        scale_x, scale_y = self.scales()
+        self.view[0] -= dx / scale_x
+        self.view[1] -= dx / scale_x
+        self.view[2] += dy / scale_y
+        self.view[3] += dy / scale_y
+        self.canvas.move("curve", dx, dy)
+        self.draw_axes()
+        self.schedule()
+
+    def zoom(self, event, factor):
+        # factor < 1 zooms in, keeping the point under the pointer still
+        scale_x, scale_y = self.scales()
+        x0, x1, y0, y1 = self.view
+        at_x = x0 + event.x / scale_x
+        at_y = y1 - event.y / scale_y
+        self.view = [at_x - (at_x - x0) * factor, at_x + (x1 - at_x) * factor,
+                     at_y - (at_y - y0) * factor, at_y + (y1 - at_y) * factor]
+        self.canvas.scale("curve", event.x, event.y, 1 / factor, 1 / factor)
+        self.draw_axes()
+        self.schedule()
+
+    def reset_view(self):
+        self.view = [-10.0, 10.0, -10.0, 10.0]
+        self.schedule(0)
+
+    # Sampling and drawing
+
+    def update(self):
+        self.settle = None
+        started = time.perf_counter()
+        if self.expression is not None:
+            self.extend()
+        self.draw()
+        self.redraw_ms = (time.perf_counter() - started) * 1000
+        # Trade detail for speed when a redraw misses the frame budget
+        if self.redraw_ms > self.FRAME_MS:
+            self.tolerance = min(self.tolerance * 1.5, 4.0)
+        else:
+            self.tolerance = max(self.tolerance / 1.5, 0.5)
+
+    def extend(self):
+        x0, x1, _, _ = self.view
+        scale_x, scale_y = self.scales()
+        if self.xs is None:
+            self.xs, self.ys = sample(self.f, x0, x1, scale_x, scale_y, self.tolerance)
+            self.sampled_scale = (scale_x, scale_y)
+            return
+        xs, ys = [self.xs], [self.ys]
+        if x0 < self.xs[0]:
+            left_x, left_y = sample(self.f, x0, self.xs[0], scale_x, scale_y, self.tolerance)
+            xs.insert(0, left_x[:-1])
+            ys.insert(0, left_y[:-1])
+        if x1 > self.xs[-1]:
+            right_x, right_y = sample(self.f, self.xs[-1], x1, scale_x, scale_y, self.tolerance)
+            xs.append(right_x[1:])
+            ys.append(right_y[1:])
+        xs, ys = numpy.concatenate(xs), numpy.concatenate(ys)
+        # Drop what is more than a view's width away, so the cache tracks the view
+        width = x1 - x0
+        keep = slice(max(0, numpy.searchsorted(xs, x0 - width) - 1), numpy.searchsorted(xs, x1 + width) + 1)
+        xs, ys = xs[keep], ys[keep]
+        old_x, old_y = self.sampled_scale
+        if scale_x > old_x * 1.25 or scale_y > old_y * 1.25:
+            # Zoomed in: refine only the visible part of the cache
+            lo = max(0, numpy.searchsorted(xs, x0) - 1)
+            hi = min(len(xs), numpy.searchsorted(xs, x1) + 1)
+            mid_x, mid_y = refine(self.f, xs[lo:hi], ys[lo:hi], scale_x, scale_y, self.tolerance)
+            xs = numpy.concatenate([xs[:lo], mid_x, xs[hi:]])
+            ys = numpy.concatenate([ys[:lo], mid_y, ys[hi:]])
+        self.sampled_scale = (scale_x, scale_y)
+        self.xs, self.ys = xs, ys
+
+    def draw(self):
+        self.canvas.delete("curve", "message")
+        self.draw_axes()
+        if self.error is not None:
+            width, height = self.size()
+            self.canvas.create_text(width / 2, height / 2, text=self.error, tags="message",
+                                    fill=self.colors["display_fg"], width=width - 20)
+            return
+        if self.xs is None:
+            return
+        width, height = self.size()
+        x0, x1, y0, y1 = self.view
+        scale_x, scale_y = self.scales()
+        lo = max(0, numpy.searchsorted(self.xs, x0) - 1)
+        hi = numpy.searchsorted(self.xs, x1) + 1
+        with numpy.errstate(all="ignore"):
+            px = (self.xs[lo:hi] - x0) * scale_x
+            py = (y1 - self.ys[lo:hi]) * scale_y
+            # Several points on one pixel draw as one
+            column, row = numpy.round(px), numpy.round(py)
+            keep = numpy.ones(len(px), dtype=bool)
+            keep[1:] = (column[1:] != column[:-1]) | (row[1:] != row[:-1])
+            px, py = px[keep], py[keep]
+            # A run of the line starts at a defined point after an undefined
+            # one or after a jump taller than the canvas (a pole)
+            defined = numpy.isfinite(py)
+            starts = defined.copy()
+            starts[1:] &= ~defined[:-1] | (numpy.abs(numpy.diff(py)) > height)
+            py = numpy.clip(py, -height, 2 * height)
+        bounds = numpy.append(numpy.flatnonzero(starts), len(py))
+        color = self.colors["highlight_bg"]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            run = defined[start:stop]
+            stop = start + (len(run) if run.all() else int(run.argmin()))
+            if stop - start >= 2:
+                points = numpy.column_stack((px[start:stop], py[start:stop])).ravel().tolist()
+                self.canvas.create_line(points, fill=color, width=2, tags="curve")
+
+    def draw_axes(self):
+        self.canvas.delete("axes")
+        width, height = self.size()
+        x0, x1, y0, y1 = self.view
+        scale_x, scale_y = self.scales()
+        color = self.colors["display_fg"]
+        if y0 <= 0 <= y1:
+            self.canvas.create_line(0, y1 * scale_y, width, y1 * scale_y, fill=color, tags="axes")
+        if x0 <= 0 <= x1:
+            self.canvas.create_line(-x0 * scale_x, 0, -x0 * scale_x, height, fill=color, tags="axes")
+        self.canvas.create_text(4, height - 4, anchor=tk.SW, text=f"{x0:.3g}", fill=color, tags="axes")
+        self.canvas.create_text(width - 4, height - 4, anchor=tk.SE, text=f"{x1:.3g}", fill=color, tags="axes")
+        self.canvas.create_text(width - 4, 4, anchor=tk.NE, text=f"{y1:.3g}", fill=color, tags="axes")
+        self.canvas.tag_lower("axes")
@@ -0,0 +1,302 @@
+import decimal
+import functools
+import math
+import operator
+from decimal import Decimal
+from fractions import Fraction
+
+from engine import MATH, Backend, ExpressionError, format_result
+
+# Precision modes for the calculator:
+#   "float"     binary floating point, the math module (the default)
+#   "decimal"   decimal arithmetic to a chosen number of significant digits
+#   "fraction"  exact rationals; functions only where the answer is rational
+
+MODES = ("float", "decimal", "fraction")
+
+# Extra digits carried through a decimal evaluation and rounded off at the end
+GUARD = 10
+
+
+# Fast paths shared by the exact and decimal backends
+
+def power_by_squaring(base, exponent, multiply, one):
+    # base^exponent in O(log exponent) multiplications; in a decimal context
+    # every product is rounded, so operands never grow past the precision
+    result = one
+    while exponent:
+        if exponent & 1:
+            result = multiply(result, base)
+        exponent >>= 1
+        if exponent:
+            base = multiply(base, base)
+    return result
+
+
+def range_product(lo, hi, multiply):
+    # lo * (lo + 1) * ... * hi by binary splitting, so both sides of every
+    # multiplication are about the same size. Short runs at the leaves are
+    # multiplied as small exact integers.
+    if hi - lo < 8:
+        result = 1
+        for k in range(lo, hi + 1):
+            result *= k
+        return result
+    mid = (lo + hi) // 2
+    return multiply(range_product(lo, mid, multiply), range_product(mid + 1, hi, multiply))
+
+
+def as_integer(value, name):
+    if value != int(value) or value < 0:
+        raise ValueError(f"{name} needs a non-negative integer")
+    return int(value)
+
+
+@functools.lru_cache(maxsize=8)
+def pi_to(digits):
+    # Chudnovsky series, summed exactly by binary splitting; each term adds
+    # about 14 digits
+    c3_over_24 = 640320 ** 3 // 24
+
+    def split(a, b):
+        if b - a == 1:
+            if a == 0:
+                p = q = 1
+            else:
+                p = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+                q = a * a * a * c3_over_24
+            t = p * (13591409 + 545140134 * a)
+            return p, q, -t if a & 1 else t
+        m = (a + b) // 2
+        p1, q1, t1 = split(a, m)
+        p2, q2, t2 = split(m, b)
+        return p1 * p2, q1 * q2, q2 * t1 + p1 * t2
+
+    _, q, t = split(0, digits // 14 + 2)
+    context = decimal.Context(prec=digits + 5)
+    root = context.sqrt(Decimal(10005))
+    return context.divide(context.multiply(426880 * q, root), t)
+
+
+@functools.lru_cache(maxsize=8)
+def e_to(digits):
+    # Sum of 1/k! for k <= n, with n! > 10^digits, by binary splitting:
+    # split(a, b) = (p, q) where p/q = sum over a < k <= b of a!/k!
+    def split(a, b):
+        if b - a == 1:
+            return 1, b
+        m = (a + b) // 2
+        p1, q1 = split(a, m)
+        p2, q2 = split(m, b)
+        return p1 * q2 + p2, q1 * q2
+
+    n = 2
+    while math.lgamma(n + 1) / math.log(10) < digits + 5:
+        n *= 2
+    p, q = split(0, n)
+    context = decimal.Context(prec=digits + 5)
+    return context.add(1, context.divide(p, q))
+
+
+# Decimal backend
+
+def decimal_context(digits):
+    return decimal.Context(prec=digits + GUARD, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN,
+                           traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+
+
+@functools.lru_cache(maxsize=8)
+def decimal_backend(digits):
+    context = decimal_context(digits)
+
+    def power(base, exponent):
+        if exponent == context.to_integral_value(exponent):
+            n = int(exponent)
+            # Rounding at each squaring loses a little; allow for it
+            with decimal.localcontext(context) as local:
+                local.prec += n.bit_length()
+                result = power_by_squaring(Decimal(base), abs(n), local.multiply, Decimal(1))
+                return context.divide(1, result) if n < 0 else context.plus(result)
+        return context.power(base, exponent)
+
+    def factorial(value):
+        n = as_integer(value, "factorial")
+        return context.plus(Decimal(range_product(1, n, context.multiply)))
+
+    def sine(value, cosine=False):
+        # Reduce into [-π, π], divide by 3^k so the Taylor series needs few
+        # terms, then undo that with sin 3x = 3 sin x - 4 sin^3 x
+        with decimal.localcontext(context) as local:
+            steps = math.isqrt(local.prec) // 2
+            local.prec += 5 + steps
+            pi = pi_to(local.prec)
+            x = Decimal(value)
+            if cosine:
+                x = pi / 2 - x
+            x = local.remainder_near(x, 2 * pi) / 3 ** steps
+            term = total = x
+            last, k = None, 2
+            square = x * x
+            while total != last:
+                last = total
+                term = -term * square / (k * (k + 1))
+                total += term
+                k += 2
+            for _ in range(steps):
+                total = total * (3 - 4 * total * total)
+        return context.plus(total)
+
+    def tangent(value):
+        return context.divide(sine(value), sine(value, cosine=True))
+
+    return Backend(
+        number=Decimal,
+        operators={
+            "+": context.add,
+            "-": context.subtract,
+            "*": context.multiply,
+            "/": context.divide,
+            "^": power,
+            "neg": context.minus,
+            "!": factorial,
+        },
+        functions={
+            "sin": sine,
+            "cos": lambda value: sine(value, cosine=True),
+            "tan": tangent,
+            "log": context.log10,
+            "ln": context.ln,
+            "sqrt": context.sqrt,
+            "sqr": lambda value: context.multiply(value, value),
+        },
+        constants={"π": pi_to(digits + GUARD), "pi": pi_to(digits + GUARD), "e": e_to(digits + GUARD)},
+    )
+
+
+# Exact rational backend
+
+def exact_root(value, degree, name):
+    # The rational degree-th root of value, if there is one
+    if value < 0 and degree % 2 == 0:
+        raise ValueError(f"{name} of a negative number")
+    sign = -1 if value < 0 else 1
+    parts = []
+    for part in (abs(value.numerator), value.denominator):
+        # A double has 53 bits of mantissa: past about 2^50 its root may be
+        # off by more than the one either side tried below
+        if part.bit_length() <= 50:
+            root = round(part ** (1 / degree))
+        elif degree == 2:
+            root = math.isqrt(part)
+        else:
+            root = integer_root(part, degree)
+        for guess in (root - 1, root, root + 1):
+            if guess >= 0 and guess ** degree == part:
+                parts.append(guess)
+                break
+        else:
+            raise ExpressionError(f"{name} has no exact value; use decimal mode")
+    return sign * Fraction(parts[0], parts[1])
+
+
+def integer_root(n, degree):
+    # Largest r with r^degree <= n, by Newton's method on integers
+    r = 1 << -(-n.bit_length() // degree)
+    while True:
+        s = ((degree - 1) * r + n // r ** (degree - 1)) // degree
+        if s >= r:
+            return r
+        r = s
+
+
+def fraction_power(base, exponent):
+    if exponent.denominator == 1:
+        return Fraction(base) ** int(exponent)
+    root = exact_root(base, exponent.denominator, "power")
+    return root ** exponent.numerator
+
+
+def fraction_function(name, exact):
+    # exact maps the inputs with a rational answer to it, e.g. sin(0) = 0
+    def apply(value):
+        if value in exact:
+            return Fraction(exact[value])
+        raise ExpressionError(f"{name}({value}) has no exact value; use decimal mode")
+    return apply
+
+
+def fraction_log10(value):
+    if value > 0:
+        for power, target in ((1, value), (-1, 1 / value)):
+            if target.denominator == 1:
+                k = len(str(target.numerator)) - 1
+                if 10 ** k == target.numerator:
+                    return Fraction(power * k)
+    raise ExpressionError(f"log({value}) has no exact value; use decimal mode")
+
+
+FRACTION = Backend(
+    number=Fraction,
+    operators={
+        "+": operator.add,
+        "-": operator.sub,
+        "*": operator.mul,
+        "/": operator.truediv,
+        "^": fraction_power,
+        "neg": operator.neg,
+        "!": lambda value: Fraction(math.factorial(as_integer(value, "factorial"))),
+    },
+    functions={
+        "sin": fraction_function("sin", {0: 0}),
+        "cos": fraction_function("cos", {0: 1}),
+        "tan": fraction_function("tan", {0: 0}),
+        "log": fraction_log10,
+        "ln": fraction_function("ln", {1: 0}),
+        "sqrt": lambda value: exact_root(value, 2, "sqrt"),
+        "sqr": lambda value: value * value,
+    },
+    constants={},
+)
+
+
+def backend_for(mode, digits=50):
+    if mode == "decimal":
+        return decimal_backend(digits)
+    if mode == "fraction":
+        return FRACTION
+    return MATH
+
+
+def coerce(value, mode, digits=50):
+    # A value from an earlier calculation (such as Ans) in the current mode's type
+    if mode == "decimal":
+        if isinstance(value, Fraction):
+            return decimal_context(digits).divide(value.numerator, value.denominator)
+        return Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    if mode == "fraction":
+        return Fraction(repr(value)) if isinstance(value, float) else Fraction(value)
+    if isinstance(value, int):
+        return value
+    return float(value)
+
+
+def format_value(value, mode, digits=50):
+    if mode == "decimal" and isinstance(value, Decimal):
+        value = value.normalize(decimal.Context(prec=digits))
+        # Plain digits rather than 1E+2 for anything that fits the precision
+        if 0 <= value.adjusted() < digits:
+            return f"{value:f}"
+        return str(value)
+    if mode == "fraction" and isinstance(value, Fraction):
+        return str(value)
+    value = format_result(value)
+    return str(value)
+
+
+def read_value(text, mode):
+    # Inverse of format_value, for a result kept as text
+    if mode == "decimal":
+        return Decimal(text)
+    if mode == "fraction":
+        return Fraction(text)
+    return int(text) if text.lstrip("-").isdigit() else float(text)
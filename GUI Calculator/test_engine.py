@@ -0,0 +1,147 @@
+import math
+from fractions import Fraction
+
+import pytest
+
+from engine import (
+    MATH, MAX_DEPTH, NOT_CONSTANT, BudgetError, Engine, ExpressionError, IncrementalParser, budgeted, build,
+    evaluate, free_names, parse, result_digits,
+)
+
+
+@pytest.mark.parametrize("text, tree", [
+    ("1+2*3", ("bin", "+", ("num", "1"), ("bin", "*", ("num", "2"), ("num", "3")))),
+    ("2^3^2", ("bin", "^", ("num", "2"), ("bin", "^", ("num", "3"), ("num", "2")))),
+    ("-2^2", ("neg", ("bin", "^", ("num", "2"), ("num", "2")))),
+    ("2π", ("bin", "*", ("num", "2"), ("name", "π"))),
+    ("3(4+1", ("bin", "*", ("num", "3"), ("bin", "+", ("num", "4"), ("num", "1")))),
+    ("sin(30)!", ("fact", ("call", "sin", ("num", "30")))),
+    ("6÷2×3", ("bin", "*", ("bin", "/", ("num", "6"), ("num", "2")), ("num", "3"))),
+])
+def test_parse(text, tree):
+    assert parse(text) == tree
+
+
+@pytest.mark.parametrize("text", ["", "2 3", "1+", "sin 3", "1)", "2$3"])
+def test_parse_errors(text):
+    with pytest.raises(ExpressionError):
+        parse(text)
+
+
+def test_nesting_limit():
+    parse("(" * (MAX_DEPTH - 1) + "1")
+    for text in ("(" * MAX_DEPTH + "1", "2^" * MAX_DEPTH + "2", "-" * MAX_DEPTH + "1", "3" + "!" * MAX_DEPTH):
+        with pytest.raises(ExpressionError):
+            parse(text)
+
+
+def test_long_chains_compile():
+    assert evaluate("+".join(["1"] * 5000)) == 5000
+    assert evaluate("-".join(["x"] * 5000), {"x": 1}) == -4998
+    assert Engine().evaluate("+".join(["2*3"] * 5000)) == 30000
+    assert Engine().evaluate("+".join(["x*2"] * 5000), {"x": 3}) == 30000
+
+
+@pytest.mark.parametrize("text, value", [
+    ("12.5*4-3/7+2^10", 12.5 * 4 - 3 / 7 + 2 ** 10),
+    ("sqr(3)+sqrt(16)", 13.0),
+    ("5!", 120),
+    ("2e", 2 * math.e),
+    ("1e3+1", 1001.0),
+])
+def test_evaluate(text, value):
+    assert evaluate(text) == pytest.approx(value)
+
+
+def test_build_folds_pure_subtrees():
+    closure, value = build(parse("2*3+1"), MATH)
+    assert value == 7
+    closure, value = build(parse("2*3+x"), MATH)
+    assert value is NOT_CONSTANT
+    assert closure({"x": 1}) == 7
+    with pytest.raises(ExpressionError):
+        closure({})
+
+
+def test_errors_surface_at_evaluation():
+    closure, value = build(parse("1/0"), MATH)
+    assert value is NOT_CONSTANT
+    with pytest.raises(ZeroDivisionError):
+        closure({})
+
+
+def test_free_names():
+    assert free_names(parse("x+y*sin(z)+π"), MATH) == {"x", "y", "z"}
+    assert free_names(parse("x+π")) == {"x", "π"}
+
+
+def test_engine_caches():
+    engine = Engine()
+    assert engine.evaluate("sin(30)+1") == engine.evaluate("sin( 30 ) + 1")
+    assert engine.compiled.hits == 1
+    engine.evaluate("sin(30)*2")
+    assert engine.subexpressions.hits >= 1
+    assert engine.evaluate("Ans*2", {"Ans": 4}) == 8
+    assert engine.evaluate("Ans*2", {"Ans": 5}) == 10
+
+
+def test_incremental_parser_matches_full_parse():
+    incremental = IncrementalParser()
+    text = ""
+    for char in "2*(3+sin(45))-1e+5/(7":
+        text += char
+        try:
+            tree = incremental.parse(text)
+        except ExpressionError:
+            with pytest.raises(ExpressionError):
+                parse(text)
+            continue
+        assert tree == parse(text)
+
+
+def test_incremental_parser_handles_edits_and_errors():
+    incremental = IncrementalParser()
+    assert incremental.parse("(1+2)*(3+4)") == parse("(1+2)*(3+4)")
+    assert incremental.parse("(1+2)*(3+5)") == parse("(1+2)*(3+5)")
+    assert incremental.parse("(1+9)*(3+5)") == parse("(1+9)*(3+5)")
+    with pytest.raises(ExpressionError):
+        incremental.parse("(1+9)$")
+    assert incremental.parse("12") == ("num", "12")
+
+
+def test_result_digits():
+    assert result_digits("!", 1000) == pytest.approx(2567.6, abs=0.1)
+    assert result_digits("^", 10, 5000) == 5000
+    assert result_digits("*", 10 ** 600, 10 ** 500) == pytest.approx(1100, abs=1)
+    assert result_digits("sqr", Fraction(1, 10 ** 300)) == pytest.approx(600, abs=1)
+    assert result_digits("*", 1.5, 10 ** 600) == 0
+
+
+@pytest.mark.parametrize("text", ["9999999!", "9^9^9", "sqr(" * 24 + "99" + ")" * 24, "(10^900)*(10^900)*(10^900)"])
+def test_budget_refuses_huge_results(text):
+    engine = Engine(budgeted(MATH, 2000))
+    with pytest.raises(BudgetError):
+        engine.evaluate(text)
+
+
+def test_budget_allows_results_within_limit():
+    engine = Engine(budgeted(MATH, 2000))
+    assert engine.evaluate("sqr(10^900)") == 10 ** 1800
+    assert engine.evaluate("2.5*4+sqr(3)") == 19.0
+
+
+def test_engine_subexpression_keys_survive_eviction():
+    engine = Engine(maxsize=1)
+    texts = [f"sin({i % 7})*{i % 5}+sqrt({i % 3})" for i in range(200)]
+    for text in texts + texts[::-1]:
+        assert engine.evaluate(text) == evaluate(text)
+    assert len(engine.keys) <= 16 and len(engine.subexpressions) <= 4
+
+
+def test_engine_reuses_shared_subtrees():
+    engine = Engine()
+    engine.evaluate("(2^10+sin(1))*3")
+    misses = engine.subexpressions.misses
+    engine.evaluate("(2^10+sin(1))*4")
+    # Only the new product is worked out
+    assert engine.subexpressions.misses == misses + 1
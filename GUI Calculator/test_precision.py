@@ -0,0 +1,30 @@
+from fractions import Fraction
+
+import pytest
+
+from precision import exact_root, integer_root
+
+
+@pytest.mark.parametrize("value, degree, root", [
+    (Fraction(9, 4), 2, Fraction(3, 2)),
+    (Fraction(0), 2, 0),
+    (Fraction(-27, 8), 3, Fraction(-3, 2)),
+    (Fraction((10 ** 40 + 1) ** 2), 2, 10 ** 40 + 1),
+    (Fraction((10 ** 30 + 7) ** 3), 3, 10 ** 30 + 7),
+    (Fraction(3 ** 40, (2 ** 60 + 1) ** 20), 20, Fraction(9, 2 ** 60 + 1)),
+])
+def test_exact_root(value, degree, root):
+    assert exact_root(value, degree, "root") == root
+
+
+@pytest.mark.parametrize("value, degree", [(Fraction(2), 2), (Fraction(10 ** 41), 2), (Fraction(-4), 2)])
+def test_exact_root_refuses(value, degree):
+    with pytest.raises(ValueError):
+        exact_root(value, degree, "root")
+
+
+def test_integer_root():
+    for n in (2, 10 ** 50, 10 ** 50 - 1, 3 ** 200 + 5):
+        for degree in (2, 3, 7):
+            r = integer_root(n, degree)
+            assert r ** degree <= n < (r + 1) ** degree
@@ -0,0 +1,104 @@
+import json
+import os
+import tkinter as tk
+
+# Colours by role. Each widget is registered with its role as it is
+# created; a theme switch then configures all of them in one Tcl script
+# built from the registry, without walking or inspecting any widget.
+
+THEMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes")
+
+LIGHT = {
+    "bg": "#f0f0f0",
+    "fg": "#000000",
+    "button_bg": "#e1e1e1",
+    "button_fg": "#000000",
+    "display_bg": "#ffffff",
+    "display_fg": "#000000",
+    "op_button_bg": "#d0d0ff",
+    "sci_button_bg": "#ffe0d0",
+    "highlight_bg": "#90caf9",
+}
+
+DARK = {
+    "bg": "#2d2d2d",
+    "fg": "#ffffff",
+    "button_bg": "#3d3d3d",
+    "button_fg": "#ffffff",
+    "display_bg": "#1e1e1e",
+    "display_fg": "#ffffff",
+    "op_button_bg": "#4040aa",
+    "sci_button_bg": "#aa4040",
+    "highlight_bg": "#0d47a1",
+}
+
+# Role -> widget option -> theme colour
+ROLES = {
+    "frame": {"bg": "bg"},
+    "text": {"bg": "bg", "fg": "fg"},
+    "display": {"bg": "display_bg", "fg": "display_fg"},
+    "button": {"bg": "button_bg", "fg": "button_fg"},
+    "operation": {"bg": "op_button_bg", "fg": "button_fg"},
+    "science": {"bg": "sci_button_bg", "fg": "button_fg"},
+}
+
+
+def load_themes(directory=THEMES_DIR):
+    # Light and Dark, then one theme per JSON file in directory, named after
+    # the file; colours a file leaves out are taken from Light
+    themes = {"Light": LIGHT, "Dark": DARK}
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    except OSError:
+        return themes
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                colors = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(colors, dict):
+            title = os.path.splitext(name)[0].replace("_", " ").replace("-", " ").title()
+            themes[title] = dict(LIGHT, **{key: str(value) for key, value in colors.items() if key in LIGHT})
+    return themes
+
+
+class ThemeRegistry:
+    def __init__(self, root, theme):
+        self.root = root
+        self.theme = theme
+        self.widgets = {role: [] for role in ROLES}
+        # Called with the new theme, for what is not a plain widget option
+        # (canvas items, for instance)
+        self.watchers = []
+
+    def options(self, role, theme=None):
+        theme = theme or self.theme
+        return {option: theme[key] for option, key in ROLES[role].items()}
+
+    def add(self, widget, role):
+        self.widgets[role].append(str(widget))
+        widget.config(**self.options(role))
+        return widget
+
+    def watch(self, callback):
+        self.watchers.append(callback)
+
+    def valid(self, theme):
+        # Whether Tk knows every colour; checked once, when a theme is loaded
+        try:
+            for value in theme.values():
+                self.root.winfo_rgb(value)
+        except tk.TclError:
+            return False
+        return True
+
+    def apply(self, theme):
+        self.theme = theme
+        commands = []
+        for role, paths in self.widgets.items():
+            options = " ".join(f"-{option} {{{value}}}" for option, value in self.options(role).items())
+            commands.extend(f"{path} configure {options}" for path in paths)
+        self.root.tk.eval("\n".join(commands))
+        for callback in self.watchers:
+            callback(theme)
@@ -0,0 +1,135 @@
+import multiprocessing
+import sys
+import time
+
+from engine import Engine, budgeted, format_result, parse
+from precision import backend_for, coerce, format_value
+
+# Evaluation away from the Tk main loop. Expressions with ! or ^ can run for
+# seconds on big integers, so they go to a worker process, where an
+# evaluation that is cancelled or over its time limit can simply be killed.
+# Everything else is cheap, with products held to the same digit limit, and
+# is evaluated in place. Decimal and fraction modes always use the worker.
+
+
+def needs_worker(text, variables=None):
+    # Whether the expression involves exact integer work that can blow up: a
+    # ! or ^, a long literal, or a big integer variable such as Ans. text
+    # may also be an already parsed tree. Unparsable text is left to the
+    # caller to report.
+    for value in (variables or {}).values():
+        if isinstance(value, int) and value.bit_length() > 128:
+            return True
+    try:
+        stack = [parse(text) if isinstance(text, str) else text]
+    except (ValueError, RecursionError):
+        return False
+    while stack:
+        node = stack.pop()
+        if node[0] == "fact" or (node[0] == "bin" and node[1] == "^") or (node[0] == "num" and len(node[1]) > 30):
+            return True
+        stack.extend(child for child in node[1:] if isinstance(child, tuple))
+    return False
+
+
+def serve(connection, max_digits):
+    # Worker process: (task, text, variables, mode, digits) in,
+    # (task, value, text, error) out. One engine per mode and precision.
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)
+    engines = {}
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        task, text, variables, mode, digits = request
+        try:
+            engine = engines.get((mode, digits))
+            if engine is None:
+                engine = engines[mode, digits] = Engine(budgeted(backend_for(mode, digits), max_digits))
+            variables = {name: coerce(value, mode, digits) for name, value in variables.items()}
+            value = format_result(engine.evaluate(text, variables))
+            # Converting a 10000 digit integer to text is itself slow; do it here
+            connection.send((task, value, format_value(value, mode, digits), None))
+        except Exception as e:
+            connection.send((task, None, None, str(e) or type(e).__name__))
+
+
+class Evaluator:
+    # One evaluation at a time in a persistent worker process. submit() hands
+    # over an expression and poll(), called from a Tk after() loop, delivers
+    # callback(value, text, error) once it is done. The worker is killed on
+    # cancel() or when timeout seconds pass, and restarted on the next submit.
+
+    def __init__(self, timeout=5.0, max_digits=10000):
+        self.timeout = timeout
+        self.max_digits = max_digits
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.connection = None
+        self.tasks = 0
+        self.pending = None
+
+    @property
+    def busy(self):
+        return self.pending is not None
+
+    def start(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.connection, child = self.context.Pipe()
+        self.process = self.context.Process(target=serve, args=(child, self.max_digits), daemon=True)
+        self.process.start()
+        child.close()
+
+    def submit(self, text, variables, callback, mode="float", digits=50):
+        self.cancel()
+        self.start()
+        self.tasks += 1
+        self.connection.send((self.tasks, text, variables, mode, digits))
+        self.pending = (self.tasks, callback, time.monotonic() + self.timeout)
+
+    def poll(self):
+        # True while the evaluation is still running
+        if self.pending is None:
+            return False
+        task, callback, deadline = self.pending
+        try:
+            ready = self.connection.poll()
+            reply = self.connection.recv() if ready else None
+        except (EOFError, OSError):
+            self.stop()
+            self.pending = None
+            callback(None, None, "Evaluation stopped")
+            return False
+        if reply is not None and reply[0] == task:
+            self.pending = None
+            callback(*reply[1:])
+            return False
+        if time.monotonic() > deadline:
+            self.stop()
+            self.pending = None
+            callback(None, None, f"Timed out after {self.timeout:g} s")
+            return False
+        return True
+
+    def cancel(self):
+        if self.pending is not None:
+            self.stop()
+            self.pending = None
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.process = self.connection = None
+
+    def close(self):
+        if self.process is not None and self.pending is None:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+        self.stop()
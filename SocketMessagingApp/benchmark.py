@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from client import MessagingClient
+from protocol import MSG_TEXT
+
+# Load generator: many simulated clients in one process. Every message carries
+# the run id, sender, sequence number and send time, so a receiver can compute
+# the end-to-end fan-out latency against the same monotonic clock.
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.bytes_received = 0
+        self.latencies = []
+        # Only messages sent inside [window_start, window_end) are counted
+        self.window_start = float("inf")
+        self.window_end = float("inf")
+
+
+def raise_fd_limit(needed):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def receiver(run_id, stats):
+    marker = f"bench {run_id} ".encode()
+
+    def on_message(msg_type, payload):
+        now = time.perf_counter_ns()
+        stats.bytes_received += len(payload)
+        if msg_type != MSG_TEXT:
+            return
+        start = payload.find(marker)
+        if start < 0:
+            return
+        sent_at = int(payload[start + len(marker):].split(b" ", 3)[2])
+        if stats.window_start <= sent_at < stats.window_end:
+            stats.received += 1
+            stats.latencies.append(now - sent_at)
+
+    return on_message
+
+
+async def send(client, run_id, index, rate, size, stop_at, stats):
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    seq = 0
+    while next_at < stop_at:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent_at = time.perf_counter_ns()
+        head = f"bench {run_id} {index} {seq} {sent_at} "
+        client.write(head + "x" * max(0, size - len(head)))
+        seq += 1
+        if sent_at >= stats.window_start:
+            stats.sent += 1
+        next_at += interval
+        if seq % 64 == 0:
+            await client.drain()
+    await client.drain()
+
+
+async def run(args):
+    stats = Stats()
+    run_id = f"{os.getpid()}-{time.monotonic_ns()}"
+    on_message = receiver(run_id, stats)
+    clients = []
+    for batch_start in range(0, args.clients, 500):
+        batch = range(batch_start, min(args.clients, batch_start + 500))
+        clients += await asyncio.gather(*(
+            MessagingClient(args.host, args.port, reconnect=False, on_message=on_message,
+                            compression=args.compress, batching=args.batch).connect()
+            for _ in batch
+        ))
+    # Let connect-time history replays drain before timing anything
+    await asyncio.sleep(0.5)
+
+    started = time.perf_counter()
+    stop_at = started + args.warmup + args.duration
+    senders = [
+        asyncio.ensure_future(send(client, run_id, index, args.rate, args.size, stop_at, stats))
+        for index, client in enumerate(clients[:args.senders])
+    ]
+    await asyncio.sleep(args.warmup)
+    bytes_before = stats.bytes_received
+    wire_before = sum(client.bytes_received for client in clients)
+    measure_start = time.perf_counter()
+    stats.window_start = time.perf_counter_ns()
+    await asyncio.gather(*senders)
+    measure_end = time.perf_counter()
+    stats.window_end = time.perf_counter_ns()
+    bytes_received = stats.bytes_received - bytes_before
+    wire_received = sum(client.bytes_received for client in clients) - wire_before
+    # In-flight fan-out may still land; it counts towards delivery and latency
+    await asyncio.sleep(args.drain)
+    sent, received = stats.sent, stats.received
+
+    for client in clients:
+        await client.close()
+
+    elapsed = measure_end - measure_start
+    latencies = sorted(stats.latencies)
+    expected = sent * (args.clients - 1)
+    return {
+        "clients": args.clients,
+        "senders": args.senders,
+        "rate_per_sender": args.rate,
+        "message_size": args.size,
+        "duration_s": round(elapsed, 3),
+        "messages_sent": sent,
+        "deliveries": received,
+        "delivery_ratio": round(received / expected, 4) if expected else 0.0,
+        "sent_per_s": round(sent / elapsed, 1),
+        "deliveries_per_s": round(received / elapsed, 1),
+        "payload_mb_received_per_s": round(bytes_received / elapsed / 1e6, 2),
+        "wire_mb_received_per_s": round(wire_received / elapsed / 1e6, 2),
+        "compression": args.compress,
+        "batching": args.batch,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) / 1e6, 3),
+            "p99": round(percentile(latencies, 0.99) / 1e6, 3),
+            "p999": round(percentile(latencies, 0.999) / 1e6, 3),
+            "max": round(latencies[-1] / 1e6, 3) if latencies else 0.0,
+        },
+    }
+
+
+def regressions(results, baseline, tolerance):
+    # Throughput may not drop, and p99 latency may not rise, by more than tolerance
+    found = []
+    if results["deliveries_per_s"] < baseline["deliveries_per_s"] * (1 - tolerance):
+        found.append(f"deliveries/s {results['deliveries_per_s']} vs baseline {baseline['deliveries_per_s']}")
+    if results["latency_ms"]["p99"] > baseline["latency_ms"]["p99"] * (1 + tolerance):
+        found.append(f"p99 {results['latency_ms']['p99']} ms vs baseline {baseline['latency_ms']['p99']} ms")
+    return found
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not start listening on {host}:{port}")
+
+
+def stop_server(server):
+    # The whole process group, workers included; a worker still serving the
+    # port would take part of the next run's connections
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(5)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for the messaging server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--clients", type=int, default=1000, help="connections to open")
+    parser.add_argument("--senders", type=int, default=10, help="how many of the clients publish")
+    parser.add_argument("--rate", type=float, default=50, help="messages per second per sender")
+    parser.add_argument("--size", type=int, default=64, help="message size in bytes")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1, help="unmeasured seconds before measuring")
+    parser.add_argument("--drain", type=float, default=1, help="seconds to wait for in-flight messages")
+    parser.add_argument("--compress", action="store_true", help="clients negotiate deflate compression")
+    parser.add_argument("--batch", action="store_true",
+                        help="clients accept batched deliveries and batch their own sends; pair with server --batch-window")
+    parser.add_argument("--spawn", action="store_true", help="start server.py for the run and stop it afterwards")
+    parser.add_argument("--server-args", default="", help='extra server.py arguments with --spawn, e.g. "--engine threaded"')
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+    args.senders = min(args.senders, args.clients)
+
+    raise_fd_limit(args.clients + 64)
+    server = None
+    if args.spawn:
+        server_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        command = [sys.executable, server_py, "--host", args.host, "--port", str(args.port)]
+        # A session of its own, so --workers children can be stopped with it
+        server = subprocess.Popen(command + shlex.split(args.server_args),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        wait_for_port(args.host, args.port)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            stop_server(server)
+    if args.spawn:
+        results["server_args"] = args.server_args
+
+    latency = results["latency_ms"]
+    print(f"{results['clients']} clients, {results['senders']} senders x {args.rate:g} msg/s, "
+          f"{args.size} B messages, {results['duration_s']} s")
+    print(f"sent {results['messages_sent']} ({results['sent_per_s']}/s), "
+          f"delivered {results['deliveries']} ({results['deliveries_per_s']}/s, "
+          f"{results['payload_mb_received_per_s']} MB/s payload, {results['wire_mb_received_per_s']} MB/s on the wire, "
+          f"ratio {results['delivery_ratio']})")
+    print(f"fan-out latency ms: p50 {latency['p50']}  p99 {latency['p99']}  "
+          f"p999 {latency['p999']}  max {latency['max']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for problem in found:
+            print(f"REGRESSION: {problem}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
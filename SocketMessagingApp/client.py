@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import random
+import sys
+
+from protocol import (
+    MSG_HELLO, MSG_PING, MSG_PONG, MSG_REPLAY_END, MSG_TEXT, MSG_WELCOME, FrameDecoder, ProtocolError, compress_frame,
+    decode_options, encode_batch, encode_frame, encode_join, encode_leave, encode_options, encode_publish,
+    encode_replay, encode_text, expand, split_offset,
+)
+
+host = "localhost"
+port = 5050
+PING_FRAME = encode_frame(MSG_PING)
+PONG_FRAME = encode_frame(MSG_PONG)
+
+
+class Message:
+    __slots__ = ("type", "payload")
+
+    def __init__(self, msg_type, payload):
+        self.type = msg_type
+        self.payload = payload
+
+    @property
+    def text(self):
+        return self.payload.decode(errors="replace")
+
+    def __repr__(self):
+        return f"<Message type={self.type} {self.payload[:40]!r}>"
+
+
+class MessagingClient:
+    # One connection to server.py. Incoming frames are read by a background task
+    # and handed out by async iteration; sends can be pipelined with write() or
+    # send_batch(). Server PINGs are answered automatically. A server silent for
+    # half of idle_timeout gets a PING of its own, and is treated as dead if the
+    # other half passes without a word back either. If the connection drops
+    # it is re-established with exponential backoff and rooms are re-joined.
+    #
+    # With compression, frames over the server's threshold travel deflated both
+    # ways once the server agrees. With batching, the server may deliver several
+    # messages as one MSG_BATCH frame, and write() holds outgoing messages for
+    # batch_window seconds so they leave as one frame too.
+
+    def __init__(self, host=host, port=port, reconnect=True, min_backoff=0.1, max_backoff=10.0, on_message=None,
+                 idle_timeout=120.0, compression=False, batching=False, batch_window=0.002):
+        self.host = host
+        self.port = port
+        self.reconnect = reconnect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.rooms = set()
+        # Offset from the last MSG_REPLAY_END, to resume history from
+        self.offset = None
+        self.writer = None
+        self.reader_task = None
+        self.incoming = asyncio.Queue()
+        # Optional callback(msg_type, payload) run straight from the read loop
+        # instead of queueing for async iteration, for high-volume consumers
+        self.on_message = on_message
+        self.connected = asyncio.Event()
+        self.closed = False
+        self.idle_timeout = idle_timeout
+        self.compression = compression
+        self.batching = batching
+        self.batch_window = batch_window
+        # Compression threshold the server agreed to in MSG_WELCOME, or None
+        self.threshold = None
+        self.pending = []
+        self.flush_handle = None
+        # Raw bytes off the socket, before inflating
+        self.bytes_received = 0
+
+    async def connect(self):
+        await self.open_connection()
+        self.reader_task = asyncio.ensure_future(self.read_loop())
+        return self
+
+    async def open_connection(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.reader, self.writer = reader, writer
+        self.threshold = None
+        self.pending = []
+        if self.compression or self.batching:
+            writer.write(encode_options(MSG_HELLO, {
+                "compression": ["deflate"] if self.compression else [],
+                "batch": self.batching,
+            }))
+        for room in self.rooms:
+            writer.write(encode_join(room))
+        self.connected.set()
+
+    async def read_loop(self):
+        try:
+            while not self.closed:
+                decoder = FrameDecoder()
+                silence = self.idle_timeout / 2 if self.idle_timeout else None
+                pinged = False
+                try:
+                    while True:
+                        try:
+                            data = await asyncio.wait_for(self.reader.read(65536), silence)
+                        except asyncio.TimeoutError:
+                            if pinged:
+                                break
+                            # Not every server pings idle clients; ask for a PONG
+                            self.writer.write(PING_FRAME)
+                            pinged = True
+                            continue
+                        if not data:
+                            break
+                        pinged = False
+                        self.bytes_received += len(data)
+                        for msg_type, payload in expand(decoder.feed(data)):
+                            if msg_type == MSG_WELCOME:
+                                settings = decode_options(payload)
+                                if settings.get("compression") == "deflate":
+                                    self.threshold = settings.get("threshold", 512)
+                                continue
+                            if msg_type == MSG_PING:
+                                self.writer.write(PONG_FRAME)
+                                continue
+                            if msg_type == MSG_PONG:
+                                continue
+                            if msg_type == MSG_REPLAY_END:
+                                self.offset, _ = split_offset(payload)
+                            if self.on_message is not None:
+                                self.on_message(msg_type, payload)
+                            else:
+                                self.incoming.put_nowait(Message(msg_type, payload))
+                except (ConnectionError, OSError, ProtocolError):
+                    # A garbled stream is dropped like a broken one
+                    pass
+                self.connected.clear()
+                self.writer.close()
+                if self.closed or not self.reconnect or not await self.reconnect_with_backoff():
+                    break
+        finally:
+            # However the loop ends, iteration must not wait forever
+            self.closed = True
+            self.connected.clear()
+            self.incoming.put_nowait(None)
+
+    async def reconnect_with_backoff(self):
+        delay = self.min_backoff
+        while not self.closed:
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            try:
+                await self.open_connection()
+                return True
+            except OSError:
+                delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def write(self, text, room=None):
+        # Queue one message without waiting; pair with drain() to pipeline
+        frame = encode_text(text) if room is None else encode_publish(room, text)
+        if not self.batching:
+            self.writer.write(self.pack(frame))
+            return
+        self.pending.append(frame)
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+
+    def pack(self, frame):
+        return frame if self.threshold is None else compress_frame(frame, self.threshold)
+
+    def flush(self):
+        # Everything written during the batch window, as one (compressed) frame
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        frames, self.pending = self.pending, []
+        if frames:
+            self.writer.write(self.pack(frames[0] if len(frames) == 1 else encode_batch(frames)))
+
+    async def drain(self):
+        await self.connected.wait()
+        self.flush()
+        await self.writer.drain()
+
+    async def send(self, text, room=None):
+        await self.connected.wait()
+        self.write(text, room)
+        self.flush()
+        await self.writer.drain()
+
+    async def send_batch(self, texts, room=None):
+        # Every message in one buffer: one write and one drain for the lot
+        encode = encode_text if room is None else (lambda text: encode_publish(room, text))
+        await self.connected.wait()
+        self.flush()
+        if self.batching:
+            self.writer.write(self.pack(encode_batch(map(encode, texts))))
+        else:
+            self.writer.write(b"".join(map(self.pack, map(encode, texts))))
+        await self.writer.drain()
+
+    async def join(self, room):
+        self.rooms.add(room)
+        await self.connected.wait()
+        self.writer.write(encode_join(room))
+        await self.writer.drain()
+
+    async def leave(self, room):
+        self.rooms.discard(room)
+        await self.connected.wait()
+        self.writer.write(encode_leave(room))
+        await self.writer.drain()
+
+    async def replay(self, offset, room=""):
+        await self.connected.wait()
+        self.writer.write(encode_replay(room, offset))
+        await self.writer.drain()
+
+    async def close(self):
+        self.closed = True
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        if self.writer is not None:
+            self.writer.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            self.incoming.put_nowait(None)
+            raise StopAsyncIteration
+        return message
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+# Command line client
+
+async def print_incoming(client):
+    async for message in client:
+        if message.type == MSG_TEXT:
+            print(f"\n{message.text}\n", end="Type a Message... ")
+        elif message.type == MSG_REPLAY_END:
+            print(f"\n-- history up to offset {client.offset} --\n", end="Type a Message... ")
+
+
+async def interactive(client):
+    # /join room, /leave room, /pub room message and /replay offset [room];
+    # anything else goes to the lobby and an empty line quits
+    loop = asyncio.get_running_loop()
+    printer = asyncio.ensure_future(print_incoming(client))
+    try:
+        while True:
+            message = await loop.run_in_executor(None, input, "Type a Message... ")
+            command, _, rest = message.partition(" ")
+            if command == "/join" and rest:
+                await client.join(rest)
+            elif command == "/leave" and rest:
+                await client.leave(rest)
+            elif command == "/pub" and " " in rest:
+                room, text = rest.split(" ", 1)
+                await client.send(text, room)
+            elif command == "/replay" and rest.split(" ")[0].isdigit():
+                offset, _, room = rest.partition(" ")
+                await client.replay(int(offset), room)
+            elif message:
+                await client.send(message)
+            else:
+                break
+    except EOFError:
+        pass
+    finally:
+        printer.cancel()
+        await client.close()
+
+
+async def run(args):
+    client = MessagingClient(args.host, args.port, reconnect=not args.no_reconnect, compression=args.compress)
+    await client.connect()
+    for room in args.join:
+        await client.join(room)
+    await interactive(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket messaging client")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--join", action="append", default=[], metavar="ROOM", help="join a room on connect")
+    parser.add_argument("--no-reconnect", action="store_true", help="exit instead of reconnecting when the server goes away")
+    parser.add_argument("--compress", action="store_true", help="ask the server for deflate compression")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
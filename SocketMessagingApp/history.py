@@ -0,0 +1,150 @@
+import bisect
+import mmap
+import os
+import struct
+import time
+
+# A record is the frame length, the room name length, the room name and the
+# encoded frame exactly as it goes on the wire, so replay never re-encodes
+RECORD = struct.Struct("!IB")
+SEGMENT_BYTES = 64 * 1024 * 1024
+# One sparse index entry per this many records keeps offset lookups cheap
+INDEX_EVERY = 256
+
+
+class Segment:
+    __slots__ = ("base", "path", "size", "count", "index_offsets", "index_positions")
+
+    def __init__(self, base, path):
+        self.base = base
+        self.path = path
+        self.size = 0
+        self.count = 0
+        self.index_offsets = []
+        self.index_positions = []
+
+    def note(self, position):
+        if self.count % INDEX_EVERY == 0:
+            self.index_offsets.append(self.base + self.count)
+            self.index_positions.append(position)
+        self.count += 1
+
+    def position_of(self, offset):
+        # Nearest indexed record at or before offset
+        i = bisect.bisect_right(self.index_offsets, offset) - 1
+        return self.index_offsets[i], self.index_positions[i]
+
+
+def iter_records(buffer, position, end):
+    while end - position >= RECORD.size:
+        frame_len, room_len = RECORD.unpack_from(buffer, position)
+        start = position + RECORD.size
+        stop = start + room_len + frame_len
+        if stop > end:
+            return
+        yield position, stop, start, room_len
+        position = stop
+
+
+class SegmentedLog:
+    # Append-only message log split into fixed-size segment files named after
+    # the offset of their first record. Appends go through a buffered file and
+    # are fsynced in batches by sync(); reads map segments with mmap.
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, sync_interval=0.05):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        self.segments = []
+        self.dirty = False
+        self.last_sync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".log"):
+                self.segments.append(self.load_segment(int(name[:-4]), os.path.join(directory, name)))
+        if not self.segments:
+            self.segments.append(Segment(0, self.segment_path(0)))
+        self.active = self.segments[-1]
+        self.file = open(self.active.path, "ab")
+
+    @property
+    def next_offset(self):
+        return self.active.base + self.active.count
+
+    def segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}.log")
+
+    def load_segment(self, base, path):
+        segment = Segment(base, path)
+        size = os.path.getsize(path)
+        if size:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for position, stop, _, _ in iter_records(mm, 0, size):
+                    segment.note(position)
+                    segment.size = stop
+        if segment.size < size:
+            # Torn write from a crash: drop the partial record
+            os.truncate(path, segment.size)
+        return segment
+
+    def append(self, room, frame):
+        if self.active.size >= self.segment_bytes:
+            self.roll()
+        room = room.encode()
+        if len(room) > 255:
+            # The record keeps the name length in one byte
+            raise ValueError("room name longer than 255 bytes")
+        offset = self.next_offset
+        self.file.write(RECORD.pack(len(frame), len(room)))
+        self.file.write(room)
+        self.file.write(frame)
+        self.active.note(self.active.size)
+        self.active.size += RECORD.size + len(room) + len(frame)
+        self.dirty = True
+        return offset
+
+    def roll(self):
+        self.sync()
+        self.file.close()
+        self.active = Segment(self.next_offset, self.segment_path(self.next_offset))
+        self.segments.append(self.active)
+        self.file = open(self.active.path, "ab")
+
+    def sync(self):
+        if self.dirty:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def sync_due(self, now):
+        return self.dirty and now - self.last_sync >= self.sync_interval
+
+    def read(self, offset=0, stop=None):
+        # Yields (offset, room, frame) for offset <= record < stop. One segment is
+        # mapped at a time and records are copied out one by one, so a replay of
+        # the whole log never holds more than a record in memory.
+        stop = self.next_offset if stop is None else min(stop, self.next_offset)
+        offset = max(offset, self.segments[0].base)
+        while offset < stop:
+            # Appends may have happened while the caller held the generator
+            self.file.flush()
+            i = bisect.bisect_right([s.base for s in self.segments], offset) - 1
+            segment = self.segments[i]
+            end = segment.size
+            current, position = segment.position_of(offset)
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as mm:
+                for _, record_end, start, room_len in iter_records(mm, position, end):
+                    if current >= stop:
+                        return
+                    if current >= offset:
+                        room = mm[start:start + room_len].decode(errors="replace")
+                        yield current, room, mm[start + room_len:record_end]
+                    current += 1
+            if current == offset:
+                return
+            offset = current
+
+    def close(self):
+        self.sync()
+        self.file.close()
@@ -0,0 +1,165 @@
+import bisect
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cheap in-process metrics. Hot paths only bump integers; formatting happens
+# when the admin endpoint is scraped.
+
+DURATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class Counter:
+    __slots__ = ("name", "help", "labels", "value")
+
+    def __init__(self, name, help, labels=""):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    # Either set directly or computed from a callback at scrape time
+    __slots__ = ("name", "help", "labels", "value", "callback")
+
+    def __init__(self, name, help, callback=None, labels=""):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+        self.callback = callback
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.labels, self.callback() if self.callback else self.value
+
+
+class Histogram:
+    __slots__ = ("name", "help", "labels", "bounds", "counts", "sum", "count")
+
+    def __init__(self, name, help, bounds=DURATION_BUCKETS, labels=""):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        prefix = self.labels + "," if self.labels else ""
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{self.name}_bucket", f'{prefix}le="{bound}"', cumulative
+        yield f"{self.name}_bucket", f'{prefix}le="+Inf"', self.count
+        yield f"{self.name}_sum", self.labels, self.sum
+        yield f"{self.name}_count", self.labels, self.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=""):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, callback=None, labels=""):
+        return self.add(Gauge(name, help, callback, labels))
+
+    def histogram(self, name, help, bounds=DURATION_BUCKETS, labels=""):
+        return self.add(Histogram(name, help, bounds, labels))
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        described = set()
+        for metric in self.metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                kind = type(metric).__name__.lower()
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+def serve_metrics(registry, host, port):
+    # GET /metrics on a daemon thread; scrapes never touch the event loop
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+class MessageLog:
+    # Per-message console output: "all" (the old behavior), "sample" (every
+    # Nth message), "async" (printed by a background thread) or "off"
+
+    MODES = ("all", "sample", "async", "off")
+
+    def __init__(self, mode="all", sample_every=100):
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.seen = 0
+        self.listener = None
+        self.logger = logging.getLogger("messaging.messages")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if mode == "async":
+            records = queue.SimpleQueue()
+            self.logger.addHandler(logging.handlers.QueueHandler(records))
+            self.listener = logging.handlers.QueueListener(records, logging.StreamHandler(sys.stdout))
+            self.listener.start()
+
+    def __call__(self, line):
+        if self.mode == "off":
+            return
+        if self.mode == "async":
+            self.logger.info(line)
+            return
+        self.seen += 1
+        if self.mode == "all" or (self.seen - 1) % self.sample_every == 0:
+            print(line)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
@@ -0,0 +1,86 @@
+import os
+import socket
+from collections import deque
+from itertools import islice
+
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+class OutboundQueue:
+    # Bounded per-connection send buffer, flushed when the socket is writable.
+    # Chunks are read-only memoryviews, so one encoded frame can sit in every
+    # recipient's queue without being copied.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.chunks = deque()
+        self.size = 0
+        self.head_sent = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def fits(self, nbytes):
+        return self.size + nbytes <= self.max_bytes
+
+    def append(self, data):
+        if not isinstance(data, memoryview):
+            data = memoryview(data)
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def drop_oldest(self, nbytes):
+        # Make room for nbytes, never dropping a chunk that is half on the wire
+        dropped = 0
+        keep_head = self.head_sent > 0
+        while self.chunks and not self.fits(nbytes):
+            if keep_head:
+                if len(self.chunks) == 1:
+                    break
+                head = self.chunks.popleft()
+                chunk = self.chunks.popleft()
+                self.chunks.appendleft(head)
+            else:
+                chunk = self.chunks.popleft()
+            self.size -= len(chunk)
+            dropped += 1
+        return dropped
+
+    def write_to(self, sock):
+        # Returns True once everything queued has been sent. All pending chunks
+        # go out in one vectored sendmsg() where the platform supports it.
+        while self.chunks:
+            try:
+                if HAS_SENDMSG:
+                    buffers = list(islice(self.chunks, IOV_MAX))
+                    buffers[0] = buffers[0][self.head_sent:]
+                    sent = sock.sendmsg(buffers)
+                else:
+                    sent = sock.send(self.chunks[0][self.head_sent:])
+            except BlockingIOError:
+                return False
+            if not self.consume(sent):
+                return False
+        return True
+
+    def consume(self, sent):
+        # Pop fully written chunks; returns False if the write stopped short
+        chunks = self.chunks
+        while sent:
+            remaining = len(chunks[0]) - self.head_sent
+            if sent < remaining:
+                self.head_sent += sent
+                return False
+            sent -= remaining
+            self.size -= len(chunks.popleft())
+            self.head_sent = 0
+        return True
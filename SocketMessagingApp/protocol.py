@@ -0,0 +1,161 @@
+import json
+import struct
+import zlib
+
+# Every frame is a 4-byte big-endian payload length, a 1-byte message type and the payload
+HEADER = struct.Struct("!IB")
+OFFSET = struct.Struct("!Q")
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+MSG_TEXT = 1
+# Server-to-server: the payload is a complete, already encoded frame to fan out
+MSG_RELAY = 2
+# Client-to-server room commands. MSG_TEXT goes to the default room.
+MSG_JOIN = 3
+MSG_LEAVE = 4
+MSG_PUBLISH = 5
+# History: a client asks for a room's messages from a log offset onwards; the
+# server ends every replay with the offset to resume from next time
+MSG_REPLAY = 6
+MSG_REPLAY_END = 7
+# Heartbeats, either direction: a PING is answered with a PONG
+MSG_PING = 8
+MSG_PONG = 9
+# Connection options: the client's HELLO says what it supports, the server's
+# WELCOME says what was agreed. Both carry a JSON object.
+MSG_HELLO = 10
+MSG_WELCOME = 11
+# Several complete frames packed into one payload
+MSG_BATCH = 12
+# Set on the type byte when the payload is deflate-compressed
+FLAG_COMPRESSED = 0x80
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(msg_type, payload=b""):
+    return HEADER.pack(len(payload), msg_type) + payload
+
+
+def encode_text(text):
+    return encode_frame(MSG_TEXT, text.encode())
+
+
+def encode_join(room):
+    return encode_frame(MSG_JOIN, room.encode())
+
+
+def encode_leave(room):
+    return encode_frame(MSG_LEAVE, room.encode())
+
+
+def encode_publish(room, text):
+    return encode_frame(MSG_PUBLISH, room.encode() + b"\0" + text.encode())
+
+
+def encode_replay(room, offset):
+    return encode_frame(MSG_REPLAY, OFFSET.pack(offset) + room.encode())
+
+
+def encode_replay_end(offset):
+    return encode_frame(MSG_REPLAY_END, OFFSET.pack(offset))
+
+
+def encode_options(msg_type, options):
+    return encode_frame(msg_type, json.dumps(options).encode())
+
+
+def decode_options(payload):
+    try:
+        options = json.loads(payload)
+    except ValueError:
+        raise ProtocolError("malformed options")
+    if not isinstance(options, dict):
+        raise ProtocolError("malformed options")
+    return options
+
+
+def encode_batch(frames):
+    return encode_frame(MSG_BATCH, b"".join(frames))
+
+
+def compress_frame(frame, threshold, level=6):
+    # Compressed copy of an encoded frame, or the frame itself when it is under
+    # threshold or does not shrink
+    if len(frame) - HEADER.size < threshold:
+        return frame
+    length, msg_type = HEADER.unpack_from(frame)
+    packed = zlib.compress(memoryview(frame)[HEADER.size:], level)
+    if len(packed) >= length:
+        return frame
+    return encode_frame(msg_type | FLAG_COMPRESSED, packed)
+
+
+def expand(frames, max_payload=MAX_PAYLOAD, nested=False):
+    # Undo compression and unpack batches, yielding plain (type, payload) pairs
+    for msg_type, payload in frames:
+        if msg_type & FLAG_COMPRESSED:
+            msg_type &= ~FLAG_COMPRESSED
+            inflater = zlib.decompressobj()
+            try:
+                payload = inflater.decompress(payload, max_payload)
+            except zlib.error as e:
+                raise ProtocolError(f"bad compressed frame: {e}")
+            if inflater.unconsumed_tail:
+                raise ProtocolError(f"compressed frame inflates past {max_payload} bytes")
+        if msg_type == MSG_BATCH:
+            if nested:
+                raise ProtocolError("batches do not nest")
+            inner = FrameDecoder(max_payload)
+            yield from expand(inner.feed(payload), max_payload, nested=True)
+            if inner.buffer:
+                raise ProtocolError("truncated frame in batch")
+        else:
+            yield msg_type, payload
+
+
+def split_offset(payload):
+    # For MSG_REPLAY and MSG_REPLAY_END payloads: offset, then the rest
+    if len(payload) < OFFSET.size:
+        raise ProtocolError("missing offset")
+    return OFFSET.unpack_from(payload)[0], payload[OFFSET.size:]
+
+
+def split_room(payload):
+    # For MSG_PUBLISH and MSG_RELAY payloads: room name, NUL, body
+    room, sep, body = payload.partition(b"\0")
+    if not sep:
+        raise ProtocolError("missing room name")
+    return room.decode(errors="replace"), body
+
+
+class FrameDecoder:
+    # Reassembles frames from arbitrary recv() chunks. Bytes are appended to one
+    # buffer and the consumed prefix is trimmed once per feed, so a frame that
+    # arrives in many pieces is not re-copied for every piece.
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        pos = 0
+        end = len(buffer)
+        with memoryview(buffer) as view:
+            while end - pos >= HEADER.size:
+                length, msg_type = HEADER.unpack_from(view, pos)
+                if length > self.max_payload:
+                    raise ProtocolError(f"frame of {length} bytes exceeds limit of {self.max_payload}")
+                start = pos + HEADER.size
+                if end - start < length:
+                    break
+                frames.append((msg_type, bytes(view[start:start + length])))
+                pos = start + length
+        if pos:
+            del buffer[:pos]
+        return frames
@@ -0,0 +1,87 @@
+import itertools
+import threading
+import time
+
+
+class Connection:
+    __slots__ = (
+        "id", "sock", "address", "outbound", "decoder", "connected_at",
+        "messages_in", "messages_out", "bytes_in", "bytes_out", "replay",
+        "last_seen", "timer", "compress", "batch", "send_lock",
+    )
+
+    def __init__(self, conn_id, sock, address, outbound=None, decoder=None):
+        self.id = conn_id
+        self.sock = sock
+        self.address = address
+        self.outbound = outbound
+        self.decoder = decoder
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.timer = None
+        # Negotiated in the HELLO/WELCOME exchange
+        self.compress = False
+        self.batch = False
+        # Held around blocking writes by the thread-per-client engine
+        self.send_lock = threading.Lock()
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Pending history replay: an iterator of frames, pulled as the socket drains
+        self.replay = None
+
+    @property
+    def name(self):
+        return f"Client-{self.id}"
+
+    def __repr__(self):
+        return f"<Connection {self.name} {self.address}>"
+
+
+class ConnectionRegistry:
+    # Connections keyed by a monotonically increasing id, so serials are never
+    # reused. Add and remove are O(1) dict operations under a lock; iteration
+    # walks an immutable snapshot that is rebuilt lazily after a change, so a
+    # broadcast can run while other threads connect or disconnect.
+
+    def __init__(self, start=1, step=1):
+        self._ids = itertools.count(start, step)
+        self._connections = {}
+        self._snapshot = ()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def add(self, sock, address, outbound=None, decoder=None):
+        with self._lock:
+            conn = Connection(next(self._ids), sock, address, outbound, decoder)
+            self._connections[conn.id] = conn
+            self._dirty = True
+        return conn
+
+    def remove(self, conn):
+        with self._lock:
+            if self._connections.pop(conn.id, None) is None:
+                return False
+            self._dirty = True
+        return True
+
+    def get(self, conn_id):
+        return self._connections.get(conn_id)
+
+    def snapshot(self):
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self._snapshot = tuple(self._connections.values())
+                    self._dirty = False
+        return self._snapshot
+
+    def __contains__(self, conn):
+        return self._connections.get(conn.id) is conn
+
+    def __len__(self):
+        return len(self._connections)
+
+    def __iter__(self):
+        return iter(self.snapshot())
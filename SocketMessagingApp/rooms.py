@@ -0,0 +1,73 @@
+import threading
+
+DEFAULT_ROOM = "lobby"
+MAX_ROOM_NAME = 64
+
+
+def valid_room(name):
+    return 0 < len(name.encode()) <= MAX_ROOM_NAME and "\0" not in name
+
+
+class Room:
+    __slots__ = ("name", "members", "snapshot")
+
+    def __init__(self, name):
+        self.name = name
+        self.members = set()
+        # Subscribers as a tuple, rebuilt only after membership changes, so a
+        # publish neither copies the set nor breaks if a subscriber is evicted
+        self.snapshot = None
+
+
+class RoomIndex:
+    # topic -> subscriber set, plus the reverse map so a disconnect only touches
+    # the rooms that connection was in
+
+    def __init__(self):
+        self.rooms = {}
+        self.memberships = {}
+        self._lock = threading.Lock()
+
+    def join(self, conn, name):
+        with self._lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = Room(name)
+            if conn in room.members:
+                return False
+            room.members.add(conn)
+            room.snapshot = None
+            self.memberships.setdefault(conn, set()).add(name)
+        return True
+
+    def leave(self, conn, name):
+        with self._lock:
+            room = self.rooms.get(name)
+            if room is None or conn not in room.members:
+                return False
+            room.members.discard(conn)
+            room.snapshot = None
+            if not room.members:
+                del self.rooms[name]
+            joined = self.memberships.get(conn)
+            joined.discard(name)
+            if not joined:
+                del self.memberships[conn]
+        return True
+
+    def leave_all(self, conn):
+        for name in tuple(self.memberships.get(conn, ())):
+            self.leave(conn, name)
+
+    def subscribers(self, name):
+        room = self.rooms.get(name)
+        if room is None:
+            return ()
+        snapshot = room.snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = room.snapshot = tuple(room.members)
+        return snapshot
+
+    def rooms_of(self, conn):
+        return self.memberships.get(conn, ())
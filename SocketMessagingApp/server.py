@@ -1,42 +1,724 @@
+import argparse
+import os
+import selectors
+import signal
 import socket
 import threading
+import time
+from collections import deque
+
+from protocol import (
+    MSG_HELLO, MSG_JOIN, MSG_LEAVE, MSG_PING, MSG_PONG, MSG_PUBLISH, MSG_RELAY, MSG_REPLAY, MSG_TEXT, MSG_WELCOME,
+    FrameDecoder, ProtocolError, compress_frame, decode_options, encode_batch, encode_frame, encode_options,
+    encode_replay_end, encode_text, expand, split_offset, split_room,
+)
+from history import SegmentedLog
+from metrics import MessageLog, MetricsRegistry, serve_metrics
+from timerwheel import TimerWheel
+from outbound import DISCONNECT, DROP_NEWEST, DROP_OLDEST, OVERFLOW_POLICIES, OutboundQueue
+from registry import Connection, ConnectionRegistry
+from rooms import DEFAULT_ROOM, RoomIndex, valid_room
 
-clients = []
 host = "localhost"
 port = 5050
-server = socket.socket()
-server.bind((host, port))
-server.listen()
+registry = ConnectionRegistry()
+rooms = RoomIndex()
+PEER_BUFFER = 64 * 1024 * 1024
+# Bytes of history queued per writable event while streaming a replay
+REPLAY_CHUNK = 64 * 1024
+PING_FRAME = encode_frame(MSG_PING)
+PONG_FRAME = encode_frame(MSG_PONG)
+log_message = MessageLog()
+
+
+def create_server_socket(host, port, reuse_port=False):
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Every worker binds the same port; the kernel spreads accepts across them
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((host, port))
+    server.listen(socket.SOMAXCONN)
+    return server
+
+
+class ServerMetrics:
+    def __init__(self, connections):
+        m = self.registry = MetricsRegistry()
+        m.gauge("messaging_connections", "Open client connections", lambda: len(connections))
+        self.connections = m.counter("messaging_connections_total", "Client connections accepted")
+        self.messages_in = m.counter("messaging_messages_in_total", "Frames received from clients")
+        self.messages_out = m.counter("messaging_messages_out_total", "Frames queued or sent to clients")
+        self.bytes_in = m.counter("messaging_bytes_in_total", "Bytes received from clients")
+        self.bytes_out = m.counter("messaging_bytes_out_total", "Bytes queued or sent to clients")
+        self.broadcast_seconds = m.histogram("messaging_broadcast_duration_seconds",
+                                             "Time to fan one message out to its room")
+        self.overflows = {
+            policy: m.counter("messaging_outbound_overflow_total",
+                              "Outbound buffer overflows by the policy applied", f'policy="{policy}"')
+            for policy in OVERFLOW_POLICIES
+        }
+        self.evicted = m.counter("messaging_evicted_clients_total", "Clients disconnected as slow consumers")
+        self.reaped = m.counter("messaging_idle_reaped_total", "Clients disconnected after missing heartbeats")
+        self.batches = m.counter("messaging_batches_total", "Micro-batches fanned out")
+        self.compressed = m.counter("messaging_compressed_frames_total",
+                                    "Compressed frame variants built (once per fan-out, not per recipient)")
+        m.gauge("messaging_outbound_queued_bytes", "Bytes waiting in all outbound queues",
+                lambda: sum(c.outbound.size for c in connections if c.outbound is not None))
+        m.gauge("messaging_outbound_queue_max_bytes", "Largest single outbound queue",
+                lambda: max((c.outbound.size for c in connections if c.outbound is not None), default=0))
+
+
+metrics = ServerMetrics(registry)
+
+
+def format_message(sender, room, text):
+    if room == DEFAULT_ROOM:
+        return f"[{sender.name}] : {text}"
+    return f"[#{room}] [{sender.name}] : {text}"
+
+
+def parse_command(msg_type, payload):
+    # Client frame -> (action, room, argument); action is "publish", "join",
+    # "leave", "replay", "ping", "hello" or None. The argument is the text, the
+    # replay offset or the HELLO options.
+    if msg_type == MSG_TEXT:
+        return "publish", DEFAULT_ROOM, payload.decode(errors="replace")
+    if msg_type == MSG_PUBLISH:
+        room, body = split_room(payload)
+        if not valid_room(room):
+            raise ProtocolError("invalid room name")
+        return "publish", room, body.decode(errors="replace")
+    if msg_type in (MSG_JOIN, MSG_LEAVE):
+        room = payload.decode(errors="replace")
+        if not valid_room(room):
+            raise ProtocolError("invalid room name")
+        return ("join" if msg_type == MSG_JOIN else "leave"), room, None
+    if msg_type == MSG_REPLAY:
+        offset, room = split_offset(payload)
+        room = room.decode(errors="replace") or DEFAULT_ROOM
+        if not valid_room(room):
+            raise ProtocolError("invalid room name")
+        return "replay", room, offset
+    if msg_type == MSG_PING:
+        return "ping", None, None
+    if msg_type == MSG_HELLO:
+        return "hello", None, decode_options(payload)
+    return None, None, None
+
+
+class FanOut:
+    # The wire variants of one delivery to a room: each frame plain or
+    # compressed, and the batch of all frames minus a given sender's own. Each
+    # variant is built at most once, however many subscribers need it.
+    __slots__ = ("items", "senders", "threshold", "metrics", "compressed", "batches")
+
+    def __init__(self, items, threshold, metrics):
+        self.items = items
+        self.senders = {sender for _, sender in items}
+        self.threshold = threshold
+        self.metrics = metrics
+        self.compressed = {}
+        self.batches = {}
+
+    def single(self, index, compress):
+        frame = self.items[index][0]
+        if not compress:
+            return frame
+        packed = self.compressed.get(index)
+        if packed is None:
+            packed = self.compressed[index] = self.pack(frame)
+        return packed
+
+    def batch(self, client, compress):
+        skip = client if client in self.senders else None
+        key = (skip, compress)
+        if key not in self.batches:
+            if compress:
+                plain = self.batch(client, False)
+                frame = self.pack(plain) if plain is not None else None
+            else:
+                frames = [frame for frame, sender in self.items if skip is None or sender is not skip]
+                frame = memoryview(encode_batch(frames)) if len(frames) > 1 else (frames[0] if frames else None)
+            self.batches[key] = frame
+        return self.batches[key]
+
+    def pack(self, frame):
+        packed = compress_frame(frame, self.threshold)
+        if packed is frame:
+            return frame
+        self.metrics.compressed.inc()
+        return memoryview(packed)
+
 
-def broadcast(message, sender_socket):
-    for client in clients:
-        if client != sender_socket:
+# Thread-per-client engine
+
+def broadcast(message, sender, room=DEFAULT_ROOM):
+    data = encode_text(message)
+    started = time.perf_counter()
+    for client in rooms.subscribers(room):
+        if client is not sender:
             try:
-                client.send(message.encode())
+                # Handler threads share sockets; frames must not interleave
+                # mid-write, but a slow reader only holds up its own lock
+                with client.send_lock:
+                    client.sock.sendall(data)
+                client.messages_out += 1
+                client.bytes_out += len(data)
+                metrics.messages_out.inc()
+                metrics.bytes_out.inc(len(data))
             except:
-                client.close()
-                clients.remove(client)
+                client.sock.close()
+                registry.remove(client)
+    metrics.broadcast_seconds.observe(time.perf_counter() - started)
 
-def handle_client(client_socket, serial):
+def handle_client(client):
     while True:
         try:
-            message = client_socket.recv(1024).decode()
-            if not message:
+            data = client.sock.recv(65536)
+            if not data:
                 break
-            print(f"[Client-{serial}] : {message}")
-            broadcast_msg = f"[Client-{serial}] : {message}"
-            broadcast(broadcast_msg, client_socket)
+            client.bytes_in += len(data)
+            metrics.bytes_in.inc(len(data))
+            for msg_type, payload in expand(client.decoder.feed(data)):
+                action, room, message = parse_command(msg_type, payload)
+                client.messages_in += 1
+                metrics.messages_in.inc()
+                if action == "join":
+                    rooms.join(client, room)
+                elif action == "leave":
+                    rooms.leave(client, room)
+                elif action == "publish":
+                    broadcast_msg = format_message(client, room, message)
+                    log_message(broadcast_msg)
+                    broadcast(broadcast_msg, client, room)
+                elif action == "ping":
+                    with client.send_lock:
+                        client.sock.sendall(PONG_FRAME)
         except:
-            print(f"Client-{serial} disconnected.")
-            clients.remove(client_socket)
             break
-    client_socket.close()
-
-print("Server is listening...")
-while True:
-    conn, address = server.accept()
-    print(f"Connected with {str(address)}")
-    clients.append(conn)
-    sr_num = str((clients.index(conn)) + 1)
-    thread = threading.Thread(target=handle_client, args=(conn,sr_num,))
-    thread.start()
\ No newline at end of file
+    rooms.leave_all(client)
+    if registry.remove(client):
+        print(f"{client.name} disconnected.")
+    client.sock.close()
+
+def run_threaded(server):
+    print("Server is listening...")
+    while True:
+        conn, address = server.accept()
+        print(f"Connected with {str(address)}")
+        client = registry.add(conn, address, decoder=FrameDecoder())
+        metrics.connections.inc()
+        rooms.join(client, DEFAULT_ROOM)
+        thread = threading.Thread(target=handle_client, args=(client,), daemon=True)
+        thread.start()
+
+
+# Single-threaded event loop engine
+
+class EventLoopServer:
+    def __init__(self, server, max_buffer=256 * 1024, overflow_policy=DROP_OLDEST, registry=registry, peers=(),
+                 history=None, replay_count=20, log=log_message, ping_interval=30.0, idle_timeout=90.0,
+                 compression=True, compress_threshold=512, batch_window=0.0):
+        self.server = server
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.registry = registry
+        self.rooms = RoomIndex()
+        self.pending_flush = set()
+        self.max_buffer = max_buffer
+        self.overflow_policy = overflow_policy
+        self.metrics = ServerMetrics(registry)
+        self.log_message = log
+        # Heartbeats: a client silent for ping_interval gets a PING and is
+        # dropped once silent for idle_timeout. Reads only stamp last_seen; the
+        # wheel holds one timer per client and re-arms it lazily when it fires.
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.timers = TimerWheel(time.monotonic())
+        # Per-message deflate for clients that ask for it, and micro-batching:
+        # with a batch_window, deliveries to a room are held that long and then
+        # fanned out together, as one MSG_BATCH frame to clients that accept it
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.batch_window = batch_window
+        self.batches = {}
+        self.batch_deadline = None
+        # Links to the other workers in --workers mode
+        self.peers = set()
+        for sock in peers:
+            sock.setblocking(False)
+            peer = Connection(-sock.fileno(), sock, "peer", OutboundQueue(PEER_BUFFER), FrameDecoder())
+            self.peers.add(peer)
+            self.selector.register(sock, selectors.EVENT_READ, peer)
+        # Message history: the optional on-disk log plus the last replay_count
+        # (offset, frame) pairs of every room, kept in memory for new joiners
+        self.history = history
+        self.replay_count = replay_count
+        self.recent = {}
+        self.next_offset = 0
+        if history is not None:
+            self.next_offset = history.next_offset
+            start = max(0, self.next_offset - replay_count * 16)
+            for offset, room, frame in history.read(start):
+                self.remember(offset, room, frame)
+
+    def accept(self):
+        # Drain the whole backlog so a connection burst costs one wakeup
+        while True:
+            try:
+                conn, address = self.server.accept()
+            except BlockingIOError:
+                return
+            conn.setblocking(False)
+            print(f"Connected with {str(address)}")
+            client = self.registry.add(conn, address, OutboundQueue(self.max_buffer), FrameDecoder())
+            self.metrics.connections.inc()
+            self.rooms.join(client, DEFAULT_ROOM)
+            self.selector.register(conn, selectors.EVENT_READ, client)
+            self.replay_recent(client, DEFAULT_ROOM)
+            if self.idle_timeout:
+                self.arm_timer(client, client.last_seen + self.ping_interval)
+
+    def arm_timer(self, client, when):
+        client.timer = self.timers.schedule(when, lambda: self.check_idle(client))
+
+    def check_idle(self, client):
+        client.timer = None
+        if client not in self.registry:
+            return
+        now = time.monotonic()
+        idle = now - client.last_seen
+        if idle >= self.idle_timeout:
+            print(f"{client.name} timed out.")
+            self.metrics.reaped.inc()
+            self.close(client)
+        elif idle >= self.ping_interval:
+            self.enqueue(client, PING_FRAME)
+            self.arm_timer(client, client.last_seen + self.idle_timeout)
+        else:
+            self.arm_timer(client, client.last_seen + self.ping_interval)
+
+    def on_event(self, client, events):
+        if events & selectors.EVENT_WRITE:
+            self.flush(client)
+        if events & selectors.EVENT_READ:
+            if client in self.peers:
+                self.read_peer(client)
+            elif client in self.registry:
+                self.read(client)
+
+    def read_peer(self, peer):
+        try:
+            data = peer.sock.recv(262144)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            print("Lost link to a worker.")
+            self.close(peer)
+            return
+        for msg_type, payload in peer.decoder.feed(data):
+            if msg_type == MSG_RELAY:
+                room, frame = split_room(payload)
+                self.record(room, frame)
+                self.deliver(room, frame, None)
+
+    def read(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            print(f"{client.name} disconnected.")
+            self.close(client)
+            return
+        client.bytes_in += len(data)
+        client.last_seen = time.monotonic()
+        self.metrics.bytes_in.inc(len(data))
+        try:
+            for msg_type, payload in expand(client.decoder.feed(data)):
+                action, room, message = parse_command(msg_type, payload)
+                client.messages_in += 1
+                self.metrics.messages_in.inc()
+                if action == "join":
+                    if self.rooms.join(client, room):
+                        self.replay_recent(client, room)
+                elif action == "leave":
+                    self.rooms.leave(client, room)
+                elif action == "replay":
+                    client.replay = self.replay_frames(room, message)
+                    self.pending_flush.add(client)
+                elif action == "ping":
+                    self.enqueue(client, PONG_FRAME)
+                elif action == "hello":
+                    self.negotiate(client, message)
+                elif action == "publish":
+                    broadcast_msg = format_message(client, room, message)
+                    self.log_message(broadcast_msg)
+                    self.broadcast(broadcast_msg, client, room)
+                    if client not in self.registry:
+                        return
+        except ProtocolError as e:
+            print(f"{client.name} dropped: {e}")
+            self.close(client)
+
+    def negotiate(self, client, options):
+        compression = options.get("compression", [])
+        batch = options.get("batch", False)
+        if not isinstance(compression, list) or not all(isinstance(name, str) for name in compression):
+            raise ProtocolError("compression must be a list of names")
+        if not isinstance(batch, bool):
+            raise ProtocolError("batch must be true or false")
+        client.compress = self.compression and "deflate" in compression
+        client.batch = batch
+        self.enqueue(client, encode_options(MSG_WELCOME, {
+            "client": client.name,
+            "compression": "deflate" if client.compress else None,
+            "threshold": self.compress_threshold,
+            "batch": client.batch,
+            "batch_window_ms": self.batch_window * 1000,
+        }))
+
+    def broadcast(self, message, sender, room=DEFAULT_ROOM):
+        # Encode once; every recipient queues a view of the same buffer
+        frame = memoryview(encode_text(message))
+        self.record(room, frame)
+        self.deliver(room, frame, sender)
+        if self.peers:
+            relay = memoryview(encode_frame(MSG_RELAY, room.encode() + b"\0" + frame))
+            for peer in self.peers:
+                self.enqueue(peer, relay)
+
+    def deliver(self, room, frame, sender):
+        if not self.batch_window:
+            self.fan_out(room, [(frame, sender)])
+            return
+        pending = self.batches.get(room)
+        if pending is None:
+            pending = self.batches[room] = []
+            if self.batch_deadline is None:
+                self.batch_deadline = time.monotonic() + self.batch_window
+        pending.append((frame, sender))
+
+    def flush_batches(self):
+        batches, self.batches = self.batches, {}
+        self.batch_deadline = None
+        for room, items in batches.items():
+            self.fan_out(room, items)
+
+    def fan_out(self, room, items):
+        # Cost is proportional to the room's subscribers, not to all connections
+        started = time.perf_counter()
+        variants = FanOut(items, self.compress_threshold, self.metrics)
+        batched = len(items) > 1
+        for client in self.rooms.subscribers(room):
+            if batched and client.batch:
+                frame = variants.batch(client, client.compress)
+                if frame is not None:
+                    self.enqueue(client, frame)
+                continue
+            for index, (frame, sender) in enumerate(items):
+                if sender is not client:
+                    self.enqueue(client, variants.single(index, client.compress))
+        if batched:
+            self.metrics.batches.inc()
+        self.metrics.broadcast_seconds.observe(time.perf_counter() - started)
+
+    def record(self, room, frame):
+        if self.history is not None:
+            offset = self.history.append(room, frame)
+        else:
+            offset = self.next_offset
+        self.next_offset = offset + 1
+        self.remember(offset, room, frame)
+
+    def remember(self, offset, room, frame):
+        recent = self.recent.get(room)
+        if recent is None:
+            recent = self.recent[room] = deque(maxlen=self.replay_count)
+        recent.append((offset, frame))
+
+    def replay_recent(self, client, room):
+        for _, frame in self.recent.get(room, ()):
+            self.enqueue(client, frame)
+        self.enqueue(client, encode_replay_end(self.next_offset))
+
+    def replay_frames(self, room, offset):
+        # Everything said in room from offset up to now, from the log when there
+        # is one and from the in-memory ring otherwise
+        stop = self.next_offset
+        if self.history is not None:
+            for _, record_room, frame in self.history.read(offset, stop):
+                if record_room == room:
+                    yield frame
+        else:
+            for record_offset, frame in tuple(self.recent.get(room, ())):
+                if offset <= record_offset < stop:
+                    yield frame
+        yield encode_replay_end(stop)
+
+    def pump_replay(self, client):
+        budget = REPLAY_CHUNK
+        for frame in client.replay:
+            client.outbound.append(frame)
+            client.messages_out += 1
+            client.bytes_out += len(frame)
+            self.metrics.messages_out.inc()
+            self.metrics.bytes_out.inc(len(frame))
+            budget -= len(frame)
+            if budget <= 0:
+                return
+        client.replay = None
+
+    def enqueue(self, client, data):
+        queue = client.outbound
+        if not queue.fits(len(data)) and client in self.peers:
+            self.metrics.overflows[DROP_NEWEST].inc()
+            return
+        if not queue.fits(len(data)):
+            self.metrics.overflows[self.overflow_policy].inc()
+            if self.overflow_policy == DISCONNECT:
+                print(f"{client.name} evicted: outbound buffer full.")
+                self.metrics.evicted.inc()
+                self.close(client)
+                return
+            if self.overflow_policy == DROP_NEWEST:
+                return
+            queue.drop_oldest(len(data))
+            if not queue.fits(len(data)):
+                return
+        was_idle = not queue
+        queue.append(data)
+        client.messages_out += 1
+        client.bytes_out += len(data)
+        self.metrics.messages_out.inc()
+        self.metrics.bytes_out.inc(len(data))
+        if was_idle:
+            # Deferred to the end of the loop iteration so every frame queued
+            # meanwhile goes out in the same sendmsg()
+            self.pending_flush.add(client)
+
+    def flush_pending(self):
+        pending, self.pending_flush = self.pending_flush, set()
+        for client in pending:
+            if client in self.registry or client in self.peers:
+                self.flush(client)
+
+    def flush(self, client):
+        try:
+            done = client.outbound.write_to(client.sock)
+        except OSError:
+            self.close(client)
+            return
+        if done and client.replay is not None:
+            # Stream the next slice of history and come back once it drains
+            self.pump_replay(client)
+            done = False
+        events = selectors.EVENT_READ if done else selectors.EVENT_READ | selectors.EVENT_WRITE
+        if self.selector.get_key(client.sock).events != events:
+            self.selector.modify(client.sock, events, client)
+
+    def close(self, client):
+        if client in self.peers:
+            self.peers.discard(client)
+        elif not self.registry.remove(client):
+            return
+        else:
+            self.rooms.leave_all(client)
+        self.pending_flush.discard(client)
+        client.replay = None
+        if client.timer is not None:
+            self.timers.cancel(client.timer)
+            client.timer = None
+        self.selector.unregister(client.sock)
+        client.sock.close()
+
+    def serve_forever(self):
+        print("Server is listening...")
+        history = self.history
+        timers = self.timers
+        try:
+            while True:
+                now = time.monotonic()
+                timeout = timers.next_timeout(now)
+                if history is not None and history.dirty:
+                    timeout = history.sync_interval if timeout is None else min(timeout, history.sync_interval)
+                if self.batch_deadline is not None:
+                    wait = max(0.0, self.batch_deadline - now)
+                    timeout = wait if timeout is None else min(timeout, wait)
+                for key, events in self.selector.select(timeout):
+                    if key.data is None:
+                        self.accept()
+                    else:
+                        self.on_event(key.data, events)
+                now = time.monotonic()
+                timers.advance(now)
+                if self.batch_deadline is not None and now >= self.batch_deadline:
+                    self.flush_batches()
+                self.flush_pending()
+                if history is not None and history.sync_due(now):
+                    history.sync()
+        finally:
+            if history is not None:
+                history.close()
+            counts = ", ".join(f"{policy}={counter.value}" for policy, counter in self.metrics.overflows.items())
+            print(f"Outbound overflows: {counts}")
+
+
+# Multi-process mode: N event loop workers share the port with SO_REUSEPORT and
+# relay every broadcast to each other over a full mesh of Unix socket pairs
+
+def exit_with_parent(fd):
+    # fd is the read end of a pipe whose write end only the parent holds, so a
+    # read returns (at EOF) once the parent is gone, however it died
+    def watch():
+        os.read(fd, 1)
+        os.kill(os.getpid(), signal.SIGTERM)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def run_workers(args):
+    count = args.workers
+    links = {index: [] for index in range(count)}
+    for i in range(count):
+        for j in range(i + 1, count):
+            a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            links[i].append(a)
+            links[j].append(b)
+
+    parent_alive, parent_writer = os.pipe()
+    pids = []
+    for index in range(count):
+        pid = os.fork()
+        if pid == 0:
+            os.close(parent_writer)
+            for other, socks in links.items():
+                if other != index:
+                    for sock in socks:
+                        sock.close()
+            exit_with_parent(parent_alive)
+            try:
+                server = create_server_socket(args.host, args.port, reuse_port=True)
+                # Ids are striped across workers so Client-N stays unique
+                worker_registry = ConnectionRegistry(start=index + 1, step=count)
+                history = None
+                if args.history_dir:
+                    history = SegmentedLog(os.path.join(args.history_dir, f"worker-{index}"),
+                                           sync_interval=args.fsync_interval / 1000)
+                loop = EventLoopServer(server, args.max_buffer, args.overflow_policy, worker_registry,
+                                       links[index], history, args.replay_count,
+                                       MessageLog(args.log, args.log_sample),
+                                       args.ping_interval, args.idle_timeout, not args.no_compression,
+                                       args.compress_threshold, args.batch_window / 1000)
+                if args.metrics_port:
+                    # One endpoint per worker on consecutive ports
+                    serve_metrics(loop.metrics.registry, args.host, args.metrics_port + index)
+                loop.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    os.close(parent_alive)
+    for socks in links.values():
+        for sock in socks:
+            sock.close()
+
+    def forward(signum, frame):
+        # Pass the signal on; the wait below then reaps every worker
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGHUP, forward)
+    print(f"Started {count} workers on port {args.port}")
+    try:
+        for pid in pids:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket messaging server")
+    parser.add_argument("--engine", choices=["eventloop", "threaded"], default="eventloop",
+                        help="eventloop handles every client on one thread; threaded starts a thread per client")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--max-buffer", type=int, default=256 * 1024,
+                        help="per-client outbound buffer limit in bytes (eventloop engine)")
+    parser.add_argument("--overflow-policy", choices=OVERFLOW_POLICIES, default=DROP_OLDEST,
+                        help="what to do when a client's outbound buffer is full (eventloop engine)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="fork this many eventloop workers sharing the port via SO_REUSEPORT")
+    parser.add_argument("--history-dir",
+                        help="keep an append-only message log here (eventloop engine; one per worker)")
+    parser.add_argument("--fsync-interval", type=float, default=50,
+                        help="milliseconds between batched fsyncs of the history log")
+    parser.add_argument("--replay-count", type=int, default=20,
+                        help="messages per room replayed to new joiners (eventloop engine)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics at http://host:PORT/metrics (workers use PORT + index)")
+    parser.add_argument("--log", choices=MessageLog.MODES, default="all",
+                        help="per-message console logging: every message, sampled, from a background thread, or off")
+    parser.add_argument("--log-sample", type=int, default=100, help="with --log sample, print one message in N")
+    parser.add_argument("--ping-interval", type=float, default=30,
+                        help="seconds of client silence before the server sends a PING (eventloop engine)")
+    parser.add_argument("--idle-timeout", type=float, default=90,
+                        help="seconds of client silence before disconnecting it; 0 disables heartbeats")
+    parser.add_argument("--no-compression", action="store_true", help="refuse deflate when clients ask for it")
+    parser.add_argument("--compress-threshold", type=int, default=512,
+                        help="payloads smaller than this many bytes are never compressed")
+    parser.add_argument("--batch-window", type=float, default=0,
+                        help="milliseconds to hold deliveries so they go out as one batch; 0 disables (eventloop engine)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if args.engine != "eventloop":
+            parser.error("--workers requires the eventloop engine")
+        if not hasattr(socket, "SO_REUSEPORT") or not hasattr(os, "fork"):
+            parser.error("--workers needs SO_REUSEPORT and fork()")
+        run_workers(args)
+        return
+
+    global log_message
+    log_message = MessageLog(args.log, args.log_sample)
+    server = create_server_socket(args.host, args.port)
+    try:
+        if args.engine == "threaded":
+            if args.metrics_port:
+                serve_metrics(metrics.registry, args.host, args.metrics_port)
+            run_threaded(server)
+        else:
+            history = None
+            if args.history_dir:
+                history = SegmentedLog(args.history_dir, sync_interval=args.fsync_interval / 1000)
+            loop = EventLoopServer(server, args.max_buffer, args.overflow_policy,
+                                   history=history, replay_count=args.replay_count, log=log_message,
+                                   ping_interval=args.ping_interval, idle_timeout=args.idle_timeout,
+                                   compression=not args.no_compression, compress_threshold=args.compress_threshold,
+                                   batch_window=args.batch_window / 1000)
+            if args.metrics_port:
+                serve_metrics(loop.metrics.registry, args.host, args.metrics_port)
+            loop.serve_forever()
+    finally:
+        log_message.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from client import MessagingClient
+from protocol import FLAG_COMPRESSED, HEADER, MSG_TEXT, MSG_WELCOME, encode_frame, encode_text
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+
+async def serve(replies):
+    # A server that answers each connection with the next of replies, then hangs up
+    replies = iter(replies)
+
+    async def handle(reader, writer):
+        writer.write(next(replies, b""))
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(handle, "localhost", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+@pytest.mark.parametrize("garbage", [
+    HEADER.pack(1 << 30, MSG_TEXT),
+    encode_frame(MSG_TEXT | FLAG_COMPRESSED, b"not deflate"),
+    encode_frame(MSG_WELCOME, b"[]"),
+])
+def test_protocol_error_ends_iteration(garbage):
+    async def main():
+        server, port = await serve([garbage])
+        async with server:
+            client = await MessagingClient(port=port, reconnect=False).connect()
+            assert [message async for message in client] == []
+            assert client.closed and not client.connected.is_set()
+    run(main())
+
+
+def test_protocol_error_reconnects():
+    async def main():
+        server, port = await serve([HEADER.pack(1 << 30, MSG_TEXT), encode_text("again")])
+        async with server:
+            client = await MessagingClient(port=port, min_backoff=0.01).connect()
+            message = await client.__anext__()
+            assert message.text == "again"
+            await client.close()
+    run(main())
@@ -0,0 +1,49 @@
+import pytest
+
+from history import SegmentedLog
+
+
+def test_append_and_read(tmp_path):
+    log = SegmentedLog(str(tmp_path))
+    assert [log.append(room, frame) for room, frame in [("lobby", b"a"), ("dev", b"bb"), ("lobby", b"")]] == [0, 1, 2]
+    assert list(log.read()) == [(0, "lobby", b"a"), (1, "dev", b"bb"), (2, "lobby", b"")]
+    assert list(log.read(1, 2)) == [(1, "dev", b"bb")]
+    log.close()
+
+
+def test_records_span_segments_and_survive_reopen(tmp_path):
+    log = SegmentedLog(str(tmp_path), segment_bytes=100)
+    for i in range(1000):
+        log.append("lobby", b"%d" % i)
+    assert len(log.segments) > 1
+    assert [frame for _, _, frame in log.read(995)] == [b"995", b"996", b"997", b"998", b"999"]
+    log.close()
+
+    log = SegmentedLog(str(tmp_path), segment_bytes=100)
+    assert log.next_offset == 1000
+    assert list(log.read(500, 501)) == [(500, "lobby", b"500")]
+    log.close()
+
+
+def test_torn_record_is_dropped_on_open(tmp_path):
+    log = SegmentedLog(str(tmp_path))
+    log.append("lobby", b"kept")
+    log.append("lobby", b"torn")
+    log.close()
+    path = log.active.path
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 2)
+    log = SegmentedLog(str(tmp_path))
+    assert list(log.read()) == [(0, "lobby", b"kept")]
+    assert log.append("lobby", b"next") == 1
+    log.close()
+
+
+def test_long_room_name_is_rejected(tmp_path):
+    log = SegmentedLog(str(tmp_path))
+    with pytest.raises(ValueError):
+        log.append("r" * 256, b"frame")
+    assert log.next_offset == 0
+    log.append("r" * 255, b"frame")
+    assert list(log.read()) == [(0, "r" * 255, b"frame")]
+    log.close()
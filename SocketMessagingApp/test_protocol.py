@@ -0,0 +1,55 @@
+import zlib
+
+import pytest
+
+from protocol import (
+    HEADER, MSG_BATCH, MSG_PING, MSG_TEXT, FLAG_COMPRESSED, FrameDecoder, ProtocolError, compress_frame,
+    encode_batch, encode_frame, encode_text, expand,
+)
+
+
+def test_decoder_reassembles_frames_split_anywhere():
+    stream = encode_text("hello") + encode_frame(MSG_PING) + encode_text("x" * 1000)
+    for size in (1, 2, 5, 7, 64, len(stream)):
+        decoder = FrameDecoder()
+        frames = []
+        for i in range(0, len(stream), size):
+            frames.extend(decoder.feed(stream[i:i + size]))
+        assert frames == [(MSG_TEXT, b"hello"), (MSG_PING, b""), (MSG_TEXT, b"x" * 1000)]
+        assert not decoder.buffer
+
+
+def test_decoder_keeps_partial_frame():
+    decoder = FrameDecoder()
+    frame = encode_text("partial")
+    assert decoder.feed(frame[:-1]) == []
+    assert decoder.feed(frame[-1:]) == [(MSG_TEXT, b"partial")]
+
+
+def test_decoder_rejects_oversized_frame():
+    with pytest.raises(ProtocolError):
+        FrameDecoder(max_payload=10).feed(HEADER.pack(11, MSG_TEXT))
+
+
+def test_expand_inflates_and_unbatches():
+    frames = [encode_text("a" * 600), encode_text("b")]
+    packed = compress_frame(encode_batch(frames), threshold=100)
+    [(msg_type, payload)] = FrameDecoder().feed(packed)
+    assert msg_type == MSG_BATCH | FLAG_COMPRESSED
+    assert list(expand([(msg_type, payload)])) == [(MSG_TEXT, b"a" * 600), (MSG_TEXT, b"b")]
+
+
+def test_compress_frame_leaves_small_frames_alone():
+    frame = encode_text("short")
+    assert compress_frame(frame, threshold=512) is frame
+
+
+@pytest.mark.parametrize("frame", [
+    (MSG_TEXT | FLAG_COMPRESSED, b"not deflate"),
+    (MSG_TEXT | FLAG_COMPRESSED, zlib.compress(b"z" * 1000)),
+    (MSG_BATCH, encode_batch([encode_text("nested")])),
+    (MSG_BATCH, encode_text("truncated")[:-1]),
+])
+def test_expand_rejects_bad_frames(frame):
+    with pytest.raises(ProtocolError):
+        list(expand([frame], max_payload=100))
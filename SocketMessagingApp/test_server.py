@@ -0,0 +1,70 @@
+import socket
+
+import pytest
+
+from protocol import (
+    MSG_JOIN, MSG_LEAVE, MSG_PUBLISH, MSG_REPLAY, MSG_WELCOME, OFFSET, FrameDecoder, ProtocolError, decode_options,
+)
+from registry import ConnectionRegistry
+from server import EventLoopServer, parse_command
+
+
+@pytest.fixture
+def server():
+    listener = socket.socket()
+    listener.bind(("localhost", 0))
+    listener.listen()
+    loop = EventLoopServer(listener, registry=ConnectionRegistry())
+    yield loop
+    loop.selector.close()
+    listener.close()
+
+
+@pytest.fixture
+def client(server):
+    ours, theirs = socket.socketpair()
+    ours.setblocking(False)
+    client = server.registry.add(ours, "test", decoder=FrameDecoder())
+    yield client
+    ours.close()
+    theirs.close()
+
+
+@pytest.mark.parametrize("options", [
+    {"compression": 5},
+    {"compression": "deflate"},
+    {"compression": [1, 2]},
+    {"batch": "yes"},
+    {"batch": 1},
+])
+def test_negotiate_rejects_malformed_options(server, client, options):
+    with pytest.raises(ProtocolError):
+        server.negotiate(client, options)
+    assert not client.compress and not client.batch
+
+
+def test_negotiate_accepts_known_options(server, client, monkeypatch):
+    sent = []
+    monkeypatch.setattr(server, "enqueue", lambda client, data: sent.append(data))
+    server.negotiate(client, {"compression": ["zstd", "deflate"], "batch": True, "future": 1})
+    assert client.compress and client.batch
+    [(msg_type, payload)] = FrameDecoder().feed(bytes(sent[0]))
+    assert msg_type == MSG_WELCOME
+    assert decode_options(payload)["compression"] == "deflate"
+
+
+def test_parse_command_rejects_invalid_rooms():
+    assert parse_command(MSG_PUBLISH, b"dev\0hi") == ("publish", "dev", "hi")
+    assert parse_command(MSG_REPLAY, OFFSET.pack(7)) == ("replay", "lobby", 7)
+    assert parse_command(MSG_JOIN, b"dev") == ("join", "dev", None)
+    assert parse_command(MSG_LEAVE, b"dev") == ("leave", "dev", None)
+    for msg_type, payload in [
+        (MSG_PUBLISH, b"r" * 300 + b"\0hi"),
+        (MSG_PUBLISH, b"\0hi"),
+        (MSG_REPLAY, OFFSET.pack(0) + b"r" * 300),
+        (MSG_JOIN, b""),
+        (MSG_JOIN, b"r" * 65),
+        (MSG_LEAVE, b"a\0b"),
+    ]:
+        with pytest.raises(ProtocolError):
+            parse_command(msg_type, payload)
@@ -0,0 +1,42 @@
+from timerwheel import TimerWheel
+
+
+def test_timers_fire_in_order_and_not_early():
+    wheel = TimerWheel(0.0)
+    fired = []
+    for when in (0.25, 0.05, 3.0, 500.0):
+        wheel.schedule(when, lambda when=when: fired.append(when))
+    wheel.advance(0.2)
+    assert fired == [0.05]
+    wheel.advance(2.95)
+    assert fired == [0.05, 0.25]
+    wheel.advance(3.0)
+    assert fired == [0.05, 0.25, 3.0]
+    assert len(wheel) == 1
+    wheel.advance(499.9)
+    assert len(fired) == 3
+    wheel.advance(500.0)
+    assert fired[-1] == 500.0 and len(wheel) == 0
+
+
+def test_timer_past_the_top_level_still_fires_on_time():
+    wheel = TimerWheel(0.0, tick=1.0, bits=2, levels=2)
+    fired = []
+    wheel.schedule(40.0, lambda: fired.append(True))
+    wheel.advance(39.0)
+    assert not fired
+    wheel.advance(40.0)
+    assert fired
+
+
+def test_cancel_and_reschedule_from_callback():
+    wheel = TimerWheel(0.0)
+    fired = []
+    cancelled = wheel.schedule(1.0, lambda: fired.append("cancelled"))
+    wheel.schedule(0.5, lambda: wheel.schedule(2.0, lambda: fired.append("again")))
+    wheel.cancel(cancelled)
+    wheel.cancel(cancelled)
+    assert len(wheel) == 1
+    wheel.advance(3.0)
+    assert fired == ["again"]
+    assert len(wheel) == 0 and wheel.next_timeout(3.0) is None
@@ -0,0 +1,84 @@
+import math
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "slot")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.slot = None
+
+
+class TimerWheel:
+    # Hierarchical timing wheel. Level 0 has one slot per tick; each higher
+    # level's slot spans a whole revolution of the level below. Scheduling and
+    # cancelling are O(1) set operations, and a tick only touches the timers
+    # that are due (plus an occasional cascade of one higher-level slot), no
+    # matter how many timers exist.
+
+    def __init__(self, now, tick=0.1, bits=6, levels=4):
+        self.tick = tick
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.levels = [[set() for _ in range(1 << bits)] for _ in range(levels)]
+        self.current = int(now / tick)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, when, callback):
+        # Rounded up so a timer never fires before its time
+        timer = Timer(max(math.ceil(when / self.tick), self.current + 1), callback)
+        self.place(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.count -= 1
+
+    def place(self, timer):
+        delta = timer.deadline - self.current
+        level = 0
+        while level < len(self.levels) - 1 and delta >= 1 << (self.bits * (level + 1)):
+            level += 1
+        # Beyond the top level's range a timer waits in its furthest slot and
+        # is re-placed when that slot cascades
+        deadline = min(timer.deadline, self.current + (1 << (self.bits * len(self.levels))) - 1)
+        slot = self.levels[level][(deadline >> (self.bits * level)) & self.mask]
+        slot.add(timer)
+        timer.slot = slot
+
+    def advance(self, now):
+        # Fire every timer due by now; callbacks may schedule or cancel timers
+        target = int(now / self.tick)
+        while self.current < target:
+            self.current += 1
+            self.cascade(1)
+            slot = self.levels[0][self.current & self.mask]
+            while slot:
+                timer = slot.pop()
+                timer.slot = None
+                self.count -= 1
+                timer.callback()
+
+    def cascade(self, level):
+        # When the level below wraps, spread the next slot of this level down
+        if level >= len(self.levels) or (self.current >> (self.bits * (level - 1))) & self.mask:
+            return
+        self.cascade(level + 1)
+        slot = self.levels[level][(self.current >> (self.bits * level)) & self.mask]
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self.place(timer)
+
+    def next_timeout(self, now):
+        # How long the event loop may sleep before the next tick is due
+        if not self.count:
+            return None
+        return max(0.0, (self.current + 1) * self.tick - now)